@@ -2,6 +2,8 @@
 ASGI config for RestoTrack project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to the order feed path are served by the server-sent events feed;
+everything else goes to the Django application.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RestoTrack.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from mealtracker.feed import ORDER_FEED_PATH, order_feed  # noqa: E402  (needs Django set up)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == ORDER_FEED_PATH:
+        await order_feed(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mealtracker.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,14 +76,216 @@ WSGI_APPLICATION = 'RestoTrack.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# RESTOTRACK_DB_PROFILE=tuned (default) keeps connections open between requests and runs
+# SQLite in WAL mode with IMMEDIATE write transactions and a busy timeout, so concurrent
+# writers queue instead of failing with "database is locked". 'default' uses Django's defaults.
+
+DATABASE_PROFILE = os.environ.get('RESTOTRACK_DB_PROFILE', 'tuned')
+
+DATABASE_PROFILES = {
+    'default': {
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {},
+    },
+    'tuned': {
+        'CONN_MAX_AGE': int(os.environ.get('RESTOTRACK_DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000'
+            ),
+        },
+    },
+}
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        # File-backed test database so multi-threaded tests get real SQLite locking
+        # (the default in-memory test database fails concurrent writers immediately)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Optional read replica (e.g. a streamed copy of the primary) for the menu and order
+# lists; see mealtracker.routers.ReadReplicaRouter.
+DATABASE_REPLICA = 'replica'
+
+if os.environ.get('RESTOTRACK_DB_REPLICA'):
+    DATABASES[DATABASE_REPLICA] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['RESTOTRACK_DB_REPLICA'],
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Branch databases
+# Map extra database aliases to the branch codes whose tables, menu, stock, orders and
+# reservations they hold, e.g. {'branch_east': ['lekki', 'ajah']}. Branches not listed
+# live in 'default', which also keeps users and the branch list. Each alias needs an
+# entry in DATABASES and `manage.py migrate --database=<alias>`.
+
+BRANCH_DATABASES = {}
+
+DATABASE_ROUTERS = ['mealtracker.routers.BranchRouter', 'mealtracker.routers.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory per process by default (and in tests). Set RESTOTRACK_REDIS_URL to
+# share one cache, e.g. the public menu payload, between all workers in production.
+
+REDIS_URL = os.environ.get('RESTOTRACK_REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'restotrack',
+    },
+}
+
+# Cache alias and lifetime for the serialized public menu
+MENU_CACHE_ALIAS = 'default'
+MENU_CACHE_TIMEOUT = 60 * 60
+
+# Order lines are priced from an in-process copy of the menu prices (mealtracker.pricing),
+# reloaded when a menu change is seen through the cache and at least this often, so
+# workers that do not share a cache pick up price changes within this many seconds.
+PRICE_BOOK_MAX_AGE = 60
+
+
+# Reservations
+# Bookings occupy a table for RESERVATION_DURATION_MINUTES, tracked on a grid of
+# RESERVATION_SLOT_MINUTES slots.
+
+RESERVATION_SLOT_MINUTES = 30
+RESERVATION_DURATION_MINUTES = 90
+
+
+# Floor plan
+# Tables count as reserved from FLOOR_RESERVED_SOON_MINUTES before a booking starts. The
+# plan is cached until a table, order or reservation changes, and for at most
+# FLOOR_CACHE_TIMEOUT seconds so upcoming bookings show up on time.
+
+FLOOR_RESERVED_SOON_MINUTES = 30
+FLOOR_CACHE_TIMEOUT = 30
+
+
+# Kitchen display feed
+# Pub/sub used to push order events to the server-sent events feed served by asgi.py.
+# The in-process broker needs no external service but only reaches consumers in the same process.
+
+ORDER_FEED_BROKER = 'mealtracker.events.InProcessBroker'
+
+
+# Low stock alerts
+# Called by the outbox workers for every stock row an order takes to or below its
+# threshold (mealtracker.alerts); each notifier receives the 'inventory.low' event.
+# Alerts also go to the order feed.
+
+LOW_STOCK_NOTIFIERS = [
+    'mealtracker.alerts.log_low_stock',
+]
+
+
+# Side effects
+# Feed events, sales rollups and low stock alerts are recorded in the outbox table with
+# the write that caused them and handled after commit, in batches (mealtracker.outbox).
+# MODE 'thread' drains the outbox on in-process worker threads; with 'command' run
+# `manage.py process_outbox --loop` alongside the web workers instead.
+
+SIDE_EFFECTS = {
+    'MODE': os.environ.get('RESTOTRACK_SIDE_EFFECTS', 'thread'),
+    'WORKERS': 2,
+    'BATCH_SIZE': 200,
+    'MAX_ATTEMPTS': 5,
+    'RETENTION_HOURS': 72,
+}
+
+
+# Order totals
+# Tax and service charge are charged on the subtotal and rounded to the cent per order.
+# `manage.py reconcile_orders` checks stored totals against the order lines.
+
+ORDER_TAX_RATE = '0.075'
+ORDER_SERVICE_RATE = '0.10'
+
+
+# Order archive
+# `manage.py archive_orders` moves closed and cancelled orders older than this many days
+# (with their items) out of the live order tables; /api/orders/archive/ serves them.
+
+ORDER_ARCHIVE_AFTER_DAYS = 90
+
+
+# Admin
+# Unfiltered admin changelists over tables with at least this many rows show the row
+# count from the database statistics instead of running COUNT(*).
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+# Idempotent order creation
+# Responses to POST /api/orders/ sent with an Idempotency-Key header are kept for
+# IDEMPOTENCY_KEY_TTL seconds; a request still running after IDEMPOTENCY_LOCK_TIMEOUT
+# seconds is presumed dead and its key may be retried. Expired keys are removed by
+# `manage.py prune_idempotency_keys`. CacheKeyStore is the alternative store.
+
+IDEMPOTENCY_STORE = 'mealtracker.idempotency.DatabaseKeyStore'
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+
+# Request profiling
+# Opt-in per-request SQL and timing instrumentation (mealtracker.middleware). When enabled,
+# responses carry Server-Timing headers and admins can read the slowest requests at
+# /api/profiling/slow-requests/.
+
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('RESTOTRACK_PROFILING') == '1',
+    'SLOW_REQUESTS': 50,
+    'DUPLICATE_THRESHOLD': 5,
+    'SERVER_TIMING': True,
+}
+
+
+# Authentication
+# Access tokens carry username/is_staff/is_superuser claims and are trusted without a user
+# lookup ('stateless'). Set RESTOTRACK_JWT_AUTH=database to load the user row per request.
+
+JWT_AUTH_MODE = os.environ.get('RESTOTRACK_JWT_AUTH', 'stateless')
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'mealtracker.authentication.StatelessJWTAuthentication' if JWT_AUTH_MODE == 'stateless'
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'mealtracker.serializers.LoginSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'mealtracker.serializers.TokenRefreshSerializer',
+}
+
+# In-process memo of refresh-token blacklist lookups; a token blacklisted by another
+# process is honoured here after at most JWT_REVOCATION_CACHE_TTL seconds.
+JWT_REVOCATION_CACHE_SIZE = 10000
+JWT_REVOCATION_CACHE_TTL = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
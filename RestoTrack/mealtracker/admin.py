@@ -1,6 +1,66 @@
-from django.contrib import admin
+import uuid
 
-from .models import Table, MenuItem, Order, OrderItem, Reservation, Inventory
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import (
+    ArchivedOrder, Branch, Table, MenuItem, Order, OrderItem, Reservation, Inventory, SalesRollup, MenuItemSalesRollup,
+)
+from .services.orders import transition_orders
+
+
+# ✅ Estimated changelist counts
+
+def estimated_row_count(model, using):
+    """
+    The row count the database keeps in its statistics for `model`'s table (Postgres
+    reltuples, SQLite's sqlite_stat1 after ANALYZE), or None when it has none.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]
+    elif connection.vendor == 'sqlite':
+        sql, params = 'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table]
+    else:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        # No statistics table yet
+        return None
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the table statistics instead of COUNT(*) for an unfiltered changelist over a
+    table bigger than ADMIN_ESTIMATED_COUNT_THRESHOLD rows; filtered lists and small
+    tables are counted exactly.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return estimate
+        return super().count
+
+
+# ✅ Branch admin
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('code', 'name')
 
 
 # ✅ Inline: Allows adding OrderItems directly inside an Order in admin
@@ -9,44 +69,140 @@ class OrderItemInline(admin.TabularInline):
     extra = 1
     fields = ('menu_item', 'quantity', 'unit_price', 'line_total')
     readonly_fields = ('line_total',)
+    autocomplete_fields = ('menu_item',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('menu_item')
+
+
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        current = self.initial.get('status')
+        if current is not None and status != current and status not in Order.TRANSITIONS[current]:
+            raise forms.ValidationError(f"Cannot change a {current} order to {status}.")
+        return status
 
 
 # ✅ Customize Order admin panel
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'table', 'status', 'subtotal', 'tax', 'service_charge', 'total', 'created_at')
-    list_filter = ('status', 'created_at')
+    form = OrderAdminForm
+    list_display = ('id', 'branch', 'table', 'status', 'subtotal', 'tax', 'service_charge', 'total', 'created_at')
+    list_filter = ('branch', 'status')
+    list_select_related = ('branch', 'table')
+    # created_at leads the (created_at, id) index
+    date_hierarchy = 'created_at'
     search_fields = ('id', 'table__number')
+    search_help_text = "Order id or table number (exact)."
+    autocomplete_fields = ('table',)
+    readonly_fields = ('subtotal', 'tax', 'service_charge', 'total')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [OrderItemInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Exact matches only, so both lookups use an index instead of LIKE over every order.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(pk=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        if term.isdigit():
+            return queryset.filter(table__number=int(term)), False
+        return queryset.none(), False
+
+    def get_readonly_fields(self, request, obj=None):
+        # New orders start pending, as they do through the API
+        if obj is None:
+            return self.readonly_fields + ('status',)
+        return self.readonly_fields
+
     def save_model(self, request, obj, form, change):
+        """
+        A changed status goes through transition_orders, like the API's, so completed_at,
+        the order.closed event and the rollups follow; the other fields are saved over
+        the transitioned row.
+        """
+        if change and 'status' in form.changed_data:
+            new_status, obj.status = obj.status, form.initial['status']
+            [result] = transition_orders([obj.pk], new_status)
+            if result['result'] == 'rejected':
+                # Moved by someone else since the form was loaded
+                self.message_user(
+                    request, f"Cannot change a {result['previous_status']} order to {new_status}.", messages.ERROR,
+                )
+            obj.refresh_from_db(fields=['status', 'completed_at', 'updated_at'])
         super().save_model(request, obj, form, change)
-        # Auto-recalculate totals after saving
-        obj.calculate_totals()
-        obj.save()
+
+    def save_formset(self, request, form, formset, change):
+        """
+        Write the lines in bulk. OrderItem.save() would re-total the order once per line;
+        save_related() totals it once after all of them.
+        """
+        if formset.model is not OrderItem:
+            return super().save_formset(request, form, formset, change)
+        lines = formset.save(commit=False)
+        now = timezone.now()
+        for line in lines:
+            line.fill_prices()
+            line.updated_at = now
+        OrderItem.objects.filter(pk__in=[line.pk for line in formset.deleted_objects]).delete()
+        OrderItem.objects.bulk_create(formset.new_objects)
+        OrderItem.objects.bulk_update(
+            [line for line, _ in formset.changed_objects], ['menu_item', 'quantity', 'unit_price', 'line_total', 'updated_at'],
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        order = form.instance
+        order.calculate_totals()
+        order.save(update_fields=['subtotal', 'tax', 'service_charge', 'total', 'updated_at'])
+
+
+# ✅ Archived orders (read-only, written by archive_orders)
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'branch', 'status', 'total', 'created_at', 'archived_at')
+    list_filter = ('branch', 'status')
+    search_fields = ('id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # ✅ MenuItem admin
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'available', 'created_at', 'updated_at')
-    list_filter = ('available',)
+    list_display = ('name', 'branch', 'price', 'available', 'created_at', 'updated_at')
+    list_filter = ('branch', 'available')
     search_fields = ('name',)
 
 
 # ✅ Table admin
 @admin.register(Table)
 class TableAdmin(admin.ModelAdmin):
-    list_display = ('number', 'capacity', 'is_available', 'created_at')
-    list_filter = ('is_available',)
+    list_display = ('number', 'branch', 'capacity', 'is_available', 'created_at')
+    list_filter = ('branch', 'is_available')
     search_fields = ('number',)
 
 
 # ✅ Inventory admin
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('item_name', 'quantity', 'min_threshold', 'is_low')
-    list_filter = ('item_name',)
+    list_display = ('item_name', 'branch', 'quantity', 'min_threshold', 'is_low')
+    list_filter = ('branch', 'item_name')
     search_fields = ('item_name',)
 
     def is_low(self, obj):
@@ -57,6 +213,30 @@ class InventoryAdmin(admin.ModelAdmin):
 # ✅ Reservation admin
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
-    list_display = ('customer_name', 'table', 'reservation_time', 'status')
-    list_filter = ('status',)
+    list_display = ('customer_name', 'branch', 'table', 'reservation_time', 'status')
+    list_filter = ('branch', 'status')
     search_fields = ('customer_name', 'table__number')
+
+
+# ✅ Sales rollup admin (read-only, maintained automatically)
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    list_filter = ('branch', 'period')
+    date_hierarchy = 'period_start'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(ReadOnlyRollupAdmin):
+    list_display = ('branch', 'period', 'period_start', 'covers', 'revenue', 'tax', 'service_charge', 'total')
+    list_select_related = ('branch',)
+
+
+@admin.register(MenuItemSalesRollup)
+class MenuItemSalesRollupAdmin(ReadOnlyRollupAdmin):
+    list_display = ('branch', 'period', 'period_start', 'menu_item', 'quantity', 'revenue')
+    list_select_related = ('branch', 'menu_item')
@@ -0,0 +1,63 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .outbox import record_events
+
+logger = logging.getLogger(__name__)
+
+
+def log_low_stock(event):
+    logger.warning(
+        "Low stock: %s has %s left (threshold %s)", event['item_name'], event['quantity'], event['min_threshold'],
+    )
+
+
+_notifiers = None
+_notifiers_lock = threading.Lock()
+
+
+def get_notifiers():
+    """
+    The callables in settings.LOW_STOCK_NOTIFIERS, imported once.
+    """
+    global _notifiers
+    if _notifiers is None:
+        with _notifiers_lock:
+            if _notifiers is None:
+                paths = getattr(settings, 'LOW_STOCK_NOTIFIERS', ['mealtracker.alerts.log_low_stock'])
+                _notifiers = [import_string(path) for path in paths]
+    return _notifiers
+
+
+def notify_low_stock(event):
+    """
+    Hand an alert to every notifier; a failing notifier is logged and does not stop the others.
+    """
+    for notify in get_notifiers():
+        try:
+            notify(event)
+        except Exception:
+            logger.exception("Low stock notifier %r failed", notify)
+
+
+def queue_low_stock_alerts(rows):
+    """
+    Record one 'inventory.low' event per inventory row; the outbox delivers them after commit.
+    """
+    at = timezone.now().isoformat()
+    record_events('inventory.low', [
+        {
+            'type': 'inventory.low',
+            'inventory': row['id'],
+            'menu_item': row['menu_item_id'],
+            'item_name': row['item_name'],
+            'quantity': row['quantity'],
+            'min_threshold': row['min_threshold'],
+            'at': at,
+        }
+        for row in rows
+    ])
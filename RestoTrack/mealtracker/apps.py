@@ -5,5 +5,6 @@ class MealtrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mealtracker'
 
-
-
+    def ready(self):
+        # Registers the outbox side-effect handlers
+        from . import handlers  # noqa: F401
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claims that let permission checks run from the token alone
+USER_CLAIMS = ['username', 'is_staff', 'is_superuser']
+
+
+class RevocationCache:
+    """
+    Bounded, TTL-limited in-process memo of blacklist lookups by token jti.
+
+    Blacklisted tokens are remembered until they expire; "not blacklisted" answers only
+    for `negative_ttl` seconds, which bounds how long a blacklisting done by another
+    process can go unnoticed here.
+    """
+    def __init__(self, max_entries=10000, negative_ttl=30):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, jti):
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                return None
+            blacklisted, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[jti]
+                return None
+            self._entries.move_to_end(jti)
+            return blacklisted
+
+    def set(self, jti, blacklisted, ttl):
+        with self._lock:
+            self._entries[jti] = (blacklisted, time.monotonic() + max(ttl, 0))
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+revocations = RevocationCache(
+    max_entries=getattr(settings, 'JWT_REVOCATION_CACHE_SIZE', 10000),
+    negative_ttl=getattr(settings, 'JWT_REVOCATION_CACHE_TTL', 30),
+)
+
+
+def stamp_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token that carries the user's role claims into every access token it
+    mints, and answers blacklist checks from `revocations` before the database.
+    """
+
+    claims_current = False
+
+    @classmethod
+    def for_user(cls, user):
+        token = stamp_claims(super().for_user(user), user)
+        token.claims_current = True
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        if self.claims_current:
+            return access
+        # Re-read roles on refresh so a demoted user loses staff rights within one access lifetime
+        user = (
+            get_user_model().objects
+            .filter(**{api_settings.USER_ID_FIELD: self.payload.get(api_settings.USER_ID_CLAIM)})
+            .first()
+        )
+        if user is not None:
+            stamp_claims(access, user)
+        return access
+
+    def remaining_lifetime(self):
+        return self.payload['exp'] - time.time()
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        blacklisted = revocations.get(jti)
+        if blacklisted is None:
+            try:
+                super().check_blacklist()
+                blacklisted = False
+            except TokenError:
+                blacklisted = True
+            ttl = self.remaining_lifetime() if blacklisted else revocations.negative_ttl
+            revocations.set(jti, blacklisted, ttl)
+        if blacklisted:
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        result = super().blacklist()
+        revocations.set(self.payload[api_settings.JTI_CLAIM], True, self.remaining_lifetime())
+        return result
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates from a valid access token without loading the user row. The request
+    user is a TokenUser built from the token's claims (id, username, is_staff,
+    is_superuser). Account deactivation or role changes apply from the next refresh.
+    """
@@ -0,0 +1,431 @@
+"""
+API benchmark suite: seeds realistic data, drives every router endpoint with the test
+client and records query counts, latency percentiles and peak memory per endpoint.
+Run it with `python manage.py benchmark_api`.
+"""
+import gc
+import io
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connection, connections
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import ClaimsRefreshToken, StatelessJWTAuthentication
+from .cache import menu_cache
+from .models import ArchivedOrder, MenuItem, Table, Inventory, Order, OrderItem
+from .readers import menu_reader, table_reader, inventory_reader, order_reader, attach_order_items
+from .serializers import MenuItemSerializer, TableSerializer, InventorySerializer, OrderSerializer
+from .services.archive import ARCHIVABLE_STATUSES, archive_orders
+from .services.orders import place_order
+
+User = get_user_model()
+
+# Authentication classes compared by the jwt-* scenarios
+AUTH_MODES = {
+    'database': JWTAuthentication,
+    'stateless': StatelessJWTAuthentication,
+}
+
+
+class Scenario:
+    """
+    One endpoint call. `request(i)` returns (method, path, data) for the i-th run, so
+    write endpoints can vary their payload between runs. With `auth` set, the user sends
+    a real bearer token checked by that AUTH_MODES class instead of being forced in.
+    """
+    def __init__(self, name, request, user=None, expected=200, auth=None):
+        self.name = name
+        self.request = request
+        self.user = user
+        self.expected = expected
+        self.auth = auth
+
+
+def seed(menu_items=1000, tables=100, orders=1000, items_per_order=8, seed_value=42):
+    """
+    Bulk-load a restaurant's worth of data and return the objects scenarios need. The
+    last tenth of the menu is low on stock, and every other finished order in the second
+    half is backdated and moved to the archive.
+    """
+    rng = random.Random(seed_value)
+    staff = User.objects.create_user('bench-staff', password='bench-password', is_staff=True)
+    customer = User.objects.create_user('bench-customer', password='bench-password')
+
+    menu = MenuItem.objects.bulk_create([
+        MenuItem(name=f"Dish {i}", description="Benchmark dish", price=Decimal(rng.randint(200, 9000)) / 100)
+        for i in range(menu_items)
+    ], batch_size=500)
+    low_from = menu_items - menu_items // 10
+    Inventory.objects.bulk_create([
+        Inventory(menu_item=item, item_name=item.name, quantity=rng.randint(0, 5) if i >= low_from else 10 ** 6)
+        for i, item in enumerate(menu)
+    ], batch_size=500)
+    floor = Table.objects.bulk_create([
+        Table(number=i + 1, capacity=rng.choice([2, 4, 6, 8])) for i in range(tables)
+    ], batch_size=500)
+
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    now = timezone.now()
+    order_rows, item_rows = [], []
+    for _ in range(orders):
+        status = rng.choice(statuses)
+        order = Order(
+            table=rng.choice(floor),
+            placed_by=customer,
+            status=status,
+            completed_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)) if status == 'closed' else None,
+        )
+        subtotal = Decimal('0.00')
+        for dish in rng.sample(menu, min(items_per_order, len(menu))):
+            quantity = rng.randint(1, 4)
+            line_total = dish.price * quantity
+            subtotal += line_total
+            item_rows.append(OrderItem(
+                order=order, menu_item=dish, quantity=quantity, unit_price=dish.price, line_total=line_total,
+            ))
+        for field, value in Order.totals_for(subtotal).items():
+            setattr(order, field, value)
+        order_rows.append(order)
+    Order.objects.bulk_create(order_rows, batch_size=500)
+    OrderItem.objects.bulk_create(item_rows, batch_size=1000)
+
+    finished = [order for order in order_rows[orders // 2:] if order.status in ARCHIVABLE_STATUSES][::2]
+    Order.objects.filter(pk__in=[order.pk for order in finished]).update(created_at=now - timedelta(days=365))
+    archive_orders(now - timedelta(days=180))
+    archived = {order.pk for order in finished}
+    call_command('rebuild_sales_rollups', verbosity=0, stdout=io.StringIO())
+
+    return {
+        'staff': staff, 'customer': customer, 'menu': menu, 'tables': floor,
+        'orders': [order for order in order_rows if order.pk not in archived],
+    }
+
+
+def scenarios(data):
+    staff, customer = data['staff'], data['customer']
+    menu, tables, orders = data['menu'], data['tables'], data['orders']
+    dish, table, order = menu[0], tables[0], orders[0]
+    archived = ArchivedOrder.objects.order_by('-created_at', '-id').first()
+    open_orders = [o for o in orders if o.status in ['pending', 'preparing']]
+    soon = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def get(path):
+        return lambda i: ('get', path, None)
+
+    return [
+        Scenario('menu-list', get('/api/menu/')),
+        Scenario('menu-list-available', get('/api/menu/?available=true')),
+        Scenario('menu-detail', get(f'/api/menu/{dish.pk}/')),
+        Scenario('tables-list', get('/api/tables/'), staff),
+        Scenario('tables-detail', get(f'/api/tables/{table.pk}/'), staff),
+        Scenario('inventory-list', get('/api/inventory/'), staff),
+        Scenario('inventory-detail', get(f'/api/inventory/{dish.inventory.pk}/'), staff),
+        Scenario('inventory-low', get('/api/inventory/low/'), staff),
+        Scenario('orders-list', get('/api/orders/'), staff),
+        Scenario('orders-list-open', get('/api/orders/?status=pending,preparing'), staff),
+        Scenario('orders-detail', get(f'/api/orders/{order.pk}/'), staff),
+        Scenario('orders-create', lambda i: ('post', '/api/orders/', {
+            'table': table.pk,
+            'items': [{'menu_item_id': item.pk, 'quantity': 1} for item in menu[i % 50:i % 50 + 5]],
+        }), customer, expected=201),
+        Scenario('orders-update-status', lambda i: (
+            'post', f'/api/orders/{open_orders[i % len(open_orders)].pk}/update_status/',
+            {'status': 'preparing' if i % 2 else 'pending'},
+        ), staff),
+        Scenario('orders-bulk-status', lambda i: ('post', '/api/orders/bulk-status/', {
+            'ids': [str(o.pk) for o in open_orders[:50]],
+            'status': 'preparing' if i % 2 else 'pending',
+        }), staff),
+        Scenario('orders-export', get('/api/orders/export/?output=ndjson'), staff),
+        Scenario('orders-archive-list', get('/api/orders/archive/'), staff),
+        Scenario('orders-archive-detail', get(f'/api/orders/archive/{archived.pk}/'), staff),
+        Scenario('reservations-list', get('/api/reservations/'), staff),
+        Scenario('reservations-create', lambda i: ('post', '/api/reservations/', {
+            'table': tables[i % len(tables)].pk,
+            'customer_name': f"Guest {i}",
+            'customer_phone': '0800',
+            'party_size': 2,
+            'reservation_time': (soon + timedelta(hours=2 * (i // len(tables)))).isoformat(),
+        }), customer, expected=201),
+        Scenario('reservations-availability', get(
+            '/api/reservations/availability/?' + urlencode({'party_size': 4, 'time': soon.isoformat()})
+        ), customer),
+        Scenario('floor-plan', get('/api/floor/'), staff),
+        Scenario('analytics-sales', get('/api/analytics/sales/?period=hour'), staff),
+        Scenario('analytics-items', get('/api/analytics/items/?period=day'), staff),
+        Scenario('profiling-slow-requests', get('/api/profiling/slow-requests/'), staff),
+        Scenario('jwt-database-tables-detail', get(f'/api/tables/{table.pk}/'), staff, auth='database'),
+        Scenario('jwt-stateless-tables-detail', get(f'/api/tables/{table.pk}/'), staff, auth='stateless'),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def call(client, scenario, i):
+    method, path, payload = scenario.request(i)
+    response = getattr(client, method)(path, payload, format='json') if payload is not None \
+        else getattr(client, method)(path)
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+    if response.status_code != scenario.expected:
+        raise AssertionError(f"{scenario.name}: expected {scenario.expected}, got {response.status_code}")
+    return response
+
+
+def run_scenario(scenario, repeat, client_factory=APIClient):
+    """
+    Measure one scenario: queries of the first run, latency over `repeat` runs and peak
+    traced memory over one extra run (tracing is kept out of the timed runs).
+    """
+    client = client_factory()
+    with ExitStack() as stack:
+        if scenario.auth:
+            token = ClaimsRefreshToken.for_user(scenario.user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            stack.enter_context(mock.patch.object(
+                APIView, 'authentication_classes', [AUTH_MODES[scenario.auth]],
+            ))
+        elif scenario.user:
+            client.force_authenticate(scenario.user)
+        return measure(client, scenario, repeat)
+
+
+def measure(client, scenario, repeat):
+    with CaptureQueriesContext(connection) as ctx:
+        call(client, scenario, 0)
+    queries = len(ctx.captured_queries)
+
+    # Like timeit, keep garbage collection pauses out of the timed runs
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(1, repeat + 1):
+            started = time.perf_counter()
+            call(client, scenario, i)
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        call(client, scenario, repeat + 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'queries': queries,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'peak_kb': round(peak / 1024, 1),
+        'rps': round(repeat / (sum(timings) / 1000), 1),
+    }
+
+
+def run(repeat=50, **seed_options):
+    menu_cache().clear()
+    data = seed(**seed_options)
+    return {scenario.name: run_scenario(scenario, repeat) for scenario in scenarios(data)}
+
+
+def serializer_cases(page_size=50):
+    """
+    (name, serialize, read) pairs that build the same list payload through the
+    ModelSerializer and through the `.values()` reader, queries included.
+    """
+    orders = Order.objects.order_by('-created_at', '-id')
+
+    def serialize(serializer_class, queryset):
+        return lambda: serializer_class(queryset.all(), many=True).data
+
+    def read(reader, queryset, fields=None):
+        lookups, represent = reader.compile(fields)
+        return lambda: represent(queryset.values(*lookups))
+
+    def read_orders(fields=None):
+        lookups, represent = order_reader.compile(fields)
+
+        def run():
+            rows = list(orders.values(*dict.fromkeys([*lookups, 'id']))[:page_size])
+            payload = represent(rows)
+            if fields is None:
+                attach_order_items(payload, [row['id'] for row in rows])
+            return payload
+        return run
+
+    order_page = orders.select_related('table').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+    )[:page_size]
+    return [
+        ('menu', serialize(MenuItemSerializer, MenuItem.objects.order_by('id')),
+         read(menu_reader, MenuItem.objects.order_by('id'))),
+        ('menu ?fields=id,name,price', serialize(MenuItemSerializer, MenuItem.objects.order_by('id')),
+         read(menu_reader, MenuItem.objects.order_by('id'), ('id', 'name', 'price'))),
+        ('tables', serialize(TableSerializer, Table.objects.all()), read(table_reader, Table.objects.all())),
+        ('inventory', serialize(InventorySerializer, Inventory.objects.all()),
+         read(inventory_reader, Inventory.objects.all())),
+        ('orders page', serialize(OrderSerializer, order_page), read_orders()),
+        ('orders page ?fields=id,status,total', serialize(OrderSerializer, order_page),
+         read_orders(('id', 'status', 'total'))),
+    ]
+
+
+def compare_serializers(repeat=20):
+    """
+    Median time to build each list payload with the serializers and with the readers.
+    """
+    results = {}
+    for name, serialize, read in serializer_cases():
+        timings = {}
+        for label, build in [('serializer_ms', serialize), ('values_ms', read)]:
+            build()
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                build()
+                runs.append((time.perf_counter() - started) * 1000)
+            timings[label] = round(statistics.median(runs), 3)
+        timings['speedup'] = round(timings['serializer_ms'] / timings['values_ms'], 1)
+        results[name] = timings
+    return results
+
+
+def compare(results, baseline, threshold, slack=None):
+    """
+    Regressions against a stored baseline: any extra query, or p95 latency / peak
+    memory more than `threshold` (a fraction) above the baseline. `slack` gives each
+    metric an absolute allowance so timer noise on fast endpoints is not reported.
+    """
+    slack = slack or {'p95_ms': 10, 'peak_kb': 64}
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} queries (baseline {base['queries']})")
+        for metric in ['p95_ms', 'peak_kb']:
+            limit = max(base[metric] * (1 + threshold), base[metric] + slack.get(metric, 0))
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]} (baseline {base[metric]})")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_baseline(path, results, parameters):
+    with open(path, 'w') as handle:
+        json.dump({'parameters': parameters, 'endpoints': results}, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+# --- Write contention ---
+
+PROFILE_FIELDS = ['CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS']
+
+
+def apply_profile(name):
+    """
+    Point new connections of the default database at settings.DATABASE_PROFILES[name].
+    The journal mode is reset first because WAL persists in the database file.
+    """
+    connection.close()
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=DELETE')
+    connection.close()
+    connections.settings[DEFAULT_DB_ALIAS].update({
+        field: settings.DATABASE_PROFILES[name][field] for field in PROFILE_FIELDS
+    })
+
+
+def place_orders(user, menu_ids, count, seed_value, timings, failures, start):
+    """
+    One worker: `count` order placements, each wrapped like a request so connections
+    are opened, reused or closed according to CONN_MAX_AGE.
+    """
+    rng = random.Random(seed_value)
+    start.wait()
+    try:
+        for _ in range(count):
+            close_old_connections()
+            items = [{'menu_item_id': menu_item_id, 'quantity': 1} for menu_item_id in rng.sample(menu_ids, 3)]
+            started = time.perf_counter()
+            try:
+                place_order(user, items)
+                timings.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                failures.append(1)
+            close_old_connections()
+    finally:
+        connections.close_all()
+
+
+def write_contention(profiles=('default', 'tuned'), threads=8, orders_per_thread=25, menu_items=10):
+    """
+    Place orders from `threads` threads at once under each database profile and report
+    throughput, latency and how many placements failed with "database is locked".
+    Needs a file-backed SQLite database; the original profile is restored afterwards.
+    """
+    original = {field: connections.settings[DEFAULT_DB_ALIAS][field] for field in PROFILE_FIELDS}
+    user, _ = User.objects.get_or_create(username='bench-contention')
+    menu = MenuItem.objects.bulk_create([
+        MenuItem(name=f"Contended dish {i}", price=Decimal('10.00')) for i in range(menu_items)
+    ])
+    Inventory.objects.bulk_create([Inventory(menu_item=item, item_name=item.name, quantity=10 ** 6) for item in menu])
+    menu_ids = [item.pk for item in menu]
+
+    results = {}
+    try:
+        for name in profiles:
+            apply_profile(name)
+            timings, failures = [], []
+            start = threading.Barrier(threads + 1)
+            workers = [
+                threading.Thread(target=place_orders, args=(user, menu_ids, orders_per_thread, i, timings, failures, start))
+                for i in range(threads)
+            ]
+            for worker in workers:
+                worker.start()
+            start.wait()
+            started = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                'placed': len(timings),
+                'failed': len(failures),
+                'orders_per_s': round(len(timings) / elapsed, 1),
+                'p50_ms': round(statistics.median(timings), 3) if timings else None,
+                'p95_ms': round(percentile(timings, 0.95), 3) if timings else None,
+            }
+    finally:
+        connection.close()
+        connections.settings[DEFAULT_DB_ALIAS].update(original)
+    return results
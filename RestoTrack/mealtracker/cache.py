@@ -0,0 +1,110 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+MENU_VERSION_KEY = 'mealtracker:menu:version'
+FLOOR_VERSION_KEY = 'mealtracker:floor:version'
+
+
+def menu_cache():
+    return caches[getattr(settings, 'MENU_CACHE_ALIAS', 'default')]
+
+
+def current_version(key):
+    """
+    Current value of a version counter. Seeded from the clock when missing (first use or
+    eviction), so a restarted counter never collides with payloads cached under an older version.
+    """
+    cache = menu_cache()
+    version = cache.get(key)
+    if version is None:
+        if cache.add(key, time.time_ns(), timeout=None):
+            # Nothing says when the data last changed, so treat it as changed now
+            cache.set(f'{key}:changed_at', timezone.now(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def version_changed_at(key):
+    """
+    When a version counter last moved, or None if that is not known.
+    """
+    return menu_cache().get(f'{key}:changed_at')
+
+
+def bump_version(key):
+    """
+    Invalidate every payload cached under a version counter by moving to a new version.
+    """
+    cache = menu_cache()
+    cache.set(f'{key}:changed_at', timezone.now(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def menu_version():
+    return current_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version():
+    bump_version(MENU_VERSION_KEY)
+
+
+def floor_version():
+    return current_version(FLOOR_VERSION_KEY)
+
+
+def bump_floor_version():
+    bump_version(FLOOR_VERSION_KEY)
+
+
+def get_menu_payload(variant, build):
+    """
+    Return the cached payload for a menu variant, building it with `build()` on a miss.
+
+    `build` returns (data, last_modified). Last-Modified is the later of that and the
+    last menu change, so deleting or hiding an item moves it too; the payload also
+    carries an ETag derived from the variant, row count and Last-Modified.
+    """
+    cache = menu_cache()
+    key = f"mealtracker:menu:{menu_version()}:{variant}"
+    payload = cache.get(key)
+    if payload is None:
+        changed_at = version_changed_at(MENU_VERSION_KEY)
+        data, last_modified = build()
+        last_modified = max(filter(None, [last_modified, changed_at]), default=None)
+        fingerprint = f"{variant}:{len(data)}:{last_modified.timestamp() if last_modified else ''}"
+        payload = {
+            'data': data,
+            'last_modified': last_modified,
+            'etag': f'"{hashlib.md5(fingerprint.encode()).hexdigest()}"',
+        }
+        cache.set(key, payload, timeout=getattr(settings, 'MENU_CACHE_TIMEOUT', None))
+    return payload
+
+
+def branch_cache_key(code):
+    return f"mealtracker:branch:{code}"
+
+
+def get_branch(code, load):
+    """
+    Return the cached branch for `code`, loading it with `load()` on a miss. Unknown
+    codes (None) are not cached.
+    """
+    cache = menu_cache()
+    branch = cache.get(branch_cache_key(code))
+    if branch is None:
+        branch = load()
+        if branch is not None:
+            cache.set(branch_cache_key(code), branch, timeout=getattr(settings, 'BRANCH_CACHE_TIMEOUT', 300))
+    return branch
+
+
+def forget_branch(code):
+    menu_cache().delete(branch_cache_key(code))
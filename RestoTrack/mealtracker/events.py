@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One feed consumer: an asyncio queue on the consumer's event loop, optionally
+    restricted to orders in some statuses.
+    """
+    def __init__(self, loop, statuses=None, maxsize=1000):
+        self.loop = loop
+        self.statuses = set(statuses or [])
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def accepts(self, event):
+        return not self.statuses or event.get('status') in self.statuses
+
+    def offer(self, event):
+        # Runs on the consumer's loop; a stalled screen drops events rather than growing memory
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Order feed subscriber is full, dropping %s", event['type'])
+
+
+class InProcessBroker:
+    """
+    Pub/sub within a single process. Publishing is thread-safe, so sync views can
+    fan events out to async feed consumers without an external broker.
+    """
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, statuses=None, loop=None):
+        subscription = Subscription(loop or asyncio.get_running_loop(), statuses)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.accepts(event):
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    The process-wide broker, built from settings.ORDER_FEED_BROKER.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'ORDER_FEED_BROKER', 'mealtracker.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def order_event(event_type, order, previous_status=None):
+    return {
+        'type': event_type,
+        'order': str(order.pk),
+        'status': order.status,
+        'previous_status': previous_status,
+        'table': order.table_id,
+        'total': str(order.total),
+        'at': timezone.now().isoformat(),
+    }
+
+
+def publish_order_event(event_type, order, previous_status=None):
+    """
+    Record an order event in the outbox; feed subscribers get it once the current
+    transaction commits.
+    """
+    from .outbox import record_events  # outbox imports models, which are not ready when this module loads
+
+    record_events(event_type, [order_event(event_type, order, previous_status)])
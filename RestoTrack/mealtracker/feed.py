@@ -0,0 +1,110 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .events import get_broker
+
+ORDER_FEED_PATH = '/api/orders/feed/'
+KEEPALIVE_SECONDS = 15
+
+
+@sync_to_async
+def is_staff_token(raw_token):
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return False
+    user = (
+        get_user_model().objects
+        .filter(**{api_settings.USER_ID_FIELD: token.get(api_settings.USER_ID_CLAIM)}, is_active=True)
+        .only('is_staff', 'is_superuser')
+        .first()
+    )
+    return bool(user and (user.is_staff or user.is_superuser))
+
+
+def raw_token(scope, query):
+    """
+    Bearer token from the Authorization header, or ?token= for EventSource clients,
+    which cannot set headers.
+    """
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+    return query.get('token', [None])[0]
+
+
+async def respond(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def order_feed(scope, receive, send):
+    """
+    Server-sent events feed of order creations and status changes for kitchen screens.
+
+    GET /api/orders/feed/?status=pending,preparing  (Staff/Admin, JWT)
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = raw_token(scope, query)
+    if not token or not await is_staff_token(token):
+        await respond(send, 401, {'detail': 'Staff authentication required.'})
+        return
+
+    statuses = [part for value in query.get('status', []) for part in value.split(',') if part]
+    broker = get_broker()
+    subscription = broker.subscribe(statuses)
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+
+        event_id = 0
+        while not disconnected.is_set():
+            getter = asyncio.ensure_future(subscription.queue.get())
+            closer = asyncio.ensure_future(disconnected.wait())
+            done, _ = await asyncio.wait({getter, closer}, timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            closer.cancel()
+            if getter not in done:
+                getter.cancel()
+                if not disconnected.is_set():
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+
+            event = getter.result()
+            event_id += 1
+            message = f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+    finally:
+        broker.unsubscribe(subscription)
+        watcher.cancel()
@@ -0,0 +1,100 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Order, SalesRollup, MenuItemSalesRollup
+
+
+def parse_moment(value, param):
+    """
+    Parse an ISO 8601 date or datetime query parameter into an aware datetime.
+    A bare date means midnight at the start of that day.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError({param: f"'{value}' is not a valid ISO 8601 date or datetime."})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_ids(value, param):
+    try:
+        return [int(part) for part in value.split(',') if part]
+    except ValueError:
+        raise ValidationError({param: "Expected a comma-separated list of ids."})
+
+
+class OrderFilterBackend(BaseFilterBackend):
+    """
+    Database-side order filters:
+
+    ?status=pending,preparing   one or more statuses
+    ?table=3,4                  one or more table ids
+    ?placed_by=12               one or more user ids
+    ?created_after=2025-10-13   created_at >= value (date or datetime)
+    ?created_before=2025-10-14  created_at < value (date or datetime)
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if params.get('status'):
+            statuses = [part for part in params['status'].split(',') if part]
+            invalid = set(statuses) - set(dict(Order.STATUS_CHOICES))
+            if invalid:
+                raise ValidationError({'status': f"Invalid status: {', '.join(sorted(invalid))}"})
+            queryset = queryset.filter(status__in=statuses)
+
+        if params.get('table'):
+            queryset = queryset.filter(table_id__in=parse_ids(params['table'], 'table'))
+
+        if params.get('placed_by'):
+            queryset = queryset.filter(placed_by_id__in=parse_ids(params['placed_by'], 'placed_by'))
+
+        if params.get('created_after'):
+            queryset = queryset.filter(created_at__gte=parse_moment(params['created_after'], 'created_after'))
+
+        if params.get('created_before'):
+            queryset = queryset.filter(created_at__lt=parse_moment(params['created_before'], 'created_before'))
+
+        return queryset
+
+
+class RollupFilterBackend(BaseFilterBackend):
+    """
+    Range filters for sales rollups:
+
+    ?period=day|hour    defaults to day
+    ?start=2025-10-01   period_start >= value (date or datetime)
+    ?end=2025-11-01     period_start < value (date or datetime)
+    ?menu_item=3,4      item rollups only
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        period = params.get('period', 'day')
+        if period not in dict(SalesRollup.PERIOD_CHOICES):
+            raise ValidationError({'period': f"Invalid period: {period}"})
+        queryset = queryset.filter(period=period)
+
+        if params.get('start'):
+            queryset = queryset.filter(period_start__gte=parse_moment(params['start'], 'start'))
+
+        if params.get('end'):
+            queryset = queryset.filter(period_start__lt=parse_moment(params['end'], 'end'))
+
+        if params.get('menu_item') and queryset.model is MenuItemSalesRollup:
+            queryset = queryset.filter(menu_item_id__in=parse_ids(params['menu_item'], 'menu_item'))
+
+        return queryset
@@ -0,0 +1,92 @@
+"""
+Live floor plan: every table's state derived from its open order and its current or
+next reservation, built with one query and cached until a table, order or reservation
+changes (models.InvalidatesFloorPlan), or FLOOR_CACHE_TIMEOUT passes so reservations
+coming up are picked up.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .cache import floor_version, menu_cache
+from .models import Order, Reservation, Table
+
+OPEN_STATUSES = ['pending', 'preparing', 'served']
+
+# Table states, in order of precedence
+UNAVAILABLE = 'unavailable'   # taken out of service (Table.is_available is off)
+SEATED = 'seated'             # has an open order
+RESERVED = 'reserved'         # a reservation is under way or starts within FLOOR_RESERVED_SOON_MINUTES
+FREE = 'free'
+
+
+def reserved_soon():
+    return timedelta(minutes=getattr(settings, 'FLOOR_RESERVED_SOON_MINUTES', 30))
+
+
+def floor_rows(branch=None, now=None):
+    """
+    One row per table with its open order and its current or next reservation,
+    read in a single query through correlated subqueries on the
+    (table, created_at) and (table, reservation_time) indexes.
+    """
+    now = now or timezone.now()
+    open_orders = Order.objects.filter(table=OuterRef('pk'), status__in=OPEN_STATUSES).order_by('-created_at')
+    reservations = (
+        Reservation.objects
+        .filter(table=OuterRef('pk'), reservation_time__lt=now + reserved_soon(), end_time__gt=now)
+        .exclude(status__in=Reservation.RELEASED_STATUSES)
+        .order_by('reservation_time')
+    )
+    tables = Table.objects.all()
+    if branch is not None:
+        tables = tables.filter(branch=branch)
+    return tables.annotate(
+        open_order=Subquery(open_orders.values('id')[:1]),
+        order_status=Subquery(open_orders.values('status')[:1]),
+        seated_since=Subquery(open_orders.values('created_at')[:1]),
+        next_reservation=Subquery(reservations.values('id')[:1]),
+        reserved_at=Subquery(reservations.values('reservation_time')[:1]),
+        party_size=Subquery(reservations.values('party_size')[:1]),
+    ).values(
+        'id', 'number', 'capacity', 'is_available', 'open_order', 'order_status', 'seated_since',
+        'next_reservation', 'reserved_at', 'party_size',
+    ).order_by('number', 'id')
+
+
+def table_state(row):
+    if not row['is_available']:
+        return UNAVAILABLE
+    if row['open_order']:
+        return SEATED
+    if row['next_reservation']:
+        return RESERVED
+    return FREE
+
+
+def get_floor_plan(branch=None):
+    """
+    The cached floor plan: {'generated_at', 'etag', 'tables': [...]}, each table with
+    its state plus the open order and reservation behind it. The ETag is a hash of the
+    tables alone, so a plan rebuilt after FLOOR_CACHE_TIMEOUT with nothing changed keeps
+    it; it is weak because generated_at still moves.
+    """
+    cache = menu_cache()
+    key = f"mealtracker:floor:{floor_version()}:{branch.code if branch else '*'}"
+    payload = cache.get(key)
+    if payload is None:
+        now = timezone.now()
+        tables = [{**row, 'state': table_state(row)} for row in floor_rows(branch, now)]
+        fingerprint = json.dumps(tables, sort_keys=True, cls=DjangoJSONEncoder)
+        payload = {
+            'generated_at': now,
+            'etag': f'W/"{hashlib.md5(fingerprint.encode()).hexdigest()}"',
+            'tables': tables,
+        }
+        cache.set(key, payload, timeout=getattr(settings, 'FLOOR_CACHE_TIMEOUT', 30))
+    return payload
@@ -0,0 +1,33 @@
+"""
+Side-effect handlers run by the outbox workers (see outbox.py). Each receives a batch
+of event payloads for its topic. Imported by MealtrackerConfig.ready().
+"""
+from .alerts import notify_low_stock
+from .events import get_broker
+from .models import Order
+from .outbox import handles
+from .services.analytics import record_closed_orders
+
+
+@handles('order.created', 'order.status', 'inventory.low')
+def publish_to_feed(events):
+    broker = get_broker()
+    for event in events:
+        broker.publish(event)
+
+
+@handles('order.closed')
+def update_sales_rollups(events):
+    """
+    Fold a whole batch of closed orders into the rollups with one set of upserts.
+    """
+    orders = Order.objects.filter(pk__in=[event['order'] for event in events], status='closed').only(
+        'id', 'branch_id', 'subtotal', 'tax', 'service_charge', 'total', 'completed_at',
+    )
+    record_closed_orders(orders)
+
+
+@handles('inventory.low')
+def send_low_stock_alerts(events):
+    for event in events:
+        notify_low_stock(event)
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, router, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey, Order
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Outcomes of KeyStore.begin()
+STARTED = 'started'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+class DatabaseKeyStore:
+    """
+    Keys live in the IdempotencyKey table. The unique (scope, key) row doubles as the
+    lock: only the request that inserts it runs, and a claim left by a crashed request
+    can be taken over once `locked_until` passes. Expired rows are removed by `prune()`.
+    """
+
+    def begin(self, scope, key, fingerprint):
+        """
+        Claim `key` for a new request, returning (outcome, stored response or None).
+        """
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=fingerprint,
+                    locked_until=now + lock_timeout(), expires_at=now + key_ttl(),
+                )
+            return STARTED, None
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None or record.expires_at <= now or (
+            record.response_status is None and record.locked_until <= now
+        ):
+            return self.take_over(record, scope, key, fingerprint, now)
+        if record.fingerprint != fingerprint:
+            return MISMATCH, None
+        if record.response_status is None:
+            return IN_PROGRESS, None
+        return REPLAY, {'status': record.response_status, 'body': record.response_body}
+
+    def take_over(self, record, scope, key, fingerprint, now):
+        if record is None:
+            # Pruned between the insert attempt and the read; start over
+            return self.begin(scope, key, fingerprint)
+        # Conditional on the values we read, so only one waiting request wins
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, locked_until=record.locked_until, expires_at=record.expires_at,
+        ).update(
+            fingerprint=fingerprint, response_status=None, response_body=None,
+            locked_until=now + lock_timeout(), expires_at=now + key_ttl(),
+        )
+        return (STARTED, None) if taken else (IN_PROGRESS, None)
+
+    def complete(self, scope, key, response_status, body):
+        IdempotencyKey.objects.filter(scope=scope, key=key).update(
+            response_status=response_status, response_body=body,
+        )
+
+    def release(self, scope, key):
+        IdempotencyKey.objects.filter(scope=scope, key=key, response_status__isnull=True).delete()
+
+    def prune(self, now=None):
+        """
+        Delete expired keys; returns how many were removed.
+        """
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+        return deleted
+
+
+class CacheKeyStore:
+    """
+    Keys live in the Django cache named by settings.IDEMPOTENCY_CACHE_ALIAS. `cache.add`
+    provides the lock, so use a cache shared by all workers (Redis) in production.
+    Entries expire on their own; `prune()` has nothing to do.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')]
+
+    def cache_key(self, scope, key, part):
+        digest = hashlib.sha256(f'{scope}\n{key}'.encode()).hexdigest()
+        return f'mealtracker:idempotency:{digest}:{part}'
+
+    def begin(self, scope, key, fingerprint):
+        stored = self.cache.get(self.cache_key(scope, key, 'result'))
+        if stored is None:
+            lock = self.cache.add(
+                self.cache_key(scope, key, 'lock'), fingerprint, timeout=lock_timeout().total_seconds(),
+            )
+            if lock:
+                return STARTED, None
+            holder = self.cache.get(self.cache_key(scope, key, 'lock'))
+            return (MISMATCH if holder not in (None, fingerprint) else IN_PROGRESS), None
+        if stored['fingerprint'] != fingerprint:
+            return MISMATCH, None
+        return REPLAY, {'status': stored['status'], 'body': stored['body']}
+
+    def complete(self, scope, key, response_status, body):
+        fingerprint = self.cache.get(self.cache_key(scope, key, 'lock'))
+        self.cache.set(
+            self.cache_key(scope, key, 'result'),
+            {'fingerprint': fingerprint, 'status': response_status, 'body': body},
+            timeout=key_ttl().total_seconds(),
+        )
+        self.cache.delete(self.cache_key(scope, key, 'lock'))
+
+    def release(self, scope, key):
+        self.cache.delete(self.cache_key(scope, key, 'lock'))
+
+    def prune(self, now=None):
+        return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_key_store():
+    """
+    The process-wide key store, built from settings.IDEMPOTENCY_STORE.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, 'IDEMPOTENCY_STORE', 'mealtracker.idempotency.DatabaseKeyStore')
+                _store = import_string(path)()
+    return _store
+
+
+def fingerprint_request(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotent(request, handler):
+    """
+    Run `handler()` (a view method returning a Response) at most once per
+    Idempotency-Key header value, user and endpoint.
+
+    A repeated key with the same body gets the stored response back with an
+    Idempotent-Replayed header and nothing else runs. A repeat that arrives while the
+    first request is still running gets 409, and reusing a key with a different body
+    gets 422. Only returned responses are stored: if the handler raises (validation
+    errors included) the key is released, so the client can correct and retry.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > 255:
+        return Response({'error': f'{HEADER} must be at most 255 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+    store = get_key_store()
+    scope = f"{request.method} {request.path} user:{request.user.pk}"
+    outcome, stored = store.begin(scope, key, fingerprint_request(request))
+    if outcome == REPLAY:
+        response = Response(stored['body'], status=stored['status'])
+        response[REPLAYED_HEADER] = 'true'
+        return response
+    if outcome == IN_PROGRESS:
+        return Response(
+            {'error': 'A request with this idempotency key is still being processed'},
+            status=status.HTTP_409_CONFLICT,
+        )
+    if outcome == MISMATCH:
+        return Response(
+            {'error': 'This idempotency key was already used with a different request body'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    try:
+        # The stored result commits together with the work it describes. Keys live in
+        # 'default'; when the branch data is elsewhere both transactions are held open
+        # and the branch commits first.
+        database = router.db_for_write(Order)
+        with transaction.atomic(), transaction.atomic(using=database, savepoint=database != DEFAULT_DB_ALIAS):
+            response = handler()
+            if response.status_code < 500:
+                store.complete(scope, key, response.status_code, response.data)
+    except Exception:
+        store.release(scope, key)
+        raise
+    if response.status_code >= 500:
+        store.release(scope, key)
+    return response
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from mealtracker.routers import branch_database
+from mealtracker.services.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed and cancelled orders older than --days, with their items, out of the live "
+        "order tables into the order archive (served at /api/orders/archive/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90),
+            help="Archive orders created more than this many days ago.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders moved per transaction.")
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Database to archive, e.g. a branch database from settings.BRANCH_DATABASES.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        with branch_database(options['database']):
+            archived = archive_orders(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} orders created before {before:%Y-%m-%d %H:%M}."))
@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from mealtracker import benchmarks
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database, drive every API endpoint and report query counts, "
+        "p50/p95 latency and peak memory. Fails when results regress past the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--menu-items', type=int, default=1000)
+        parser.add_argument('--tables', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--items-per-order', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs per endpoint.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help="Allowed relative increase in p95 latency and peak memory.")
+        parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline.")
+        parser.add_argument('--no-compare', action='store_true', help="Only report, never fail.")
+        parser.add_argument('--serializers', action='store_true',
+                            help="Also time list payloads built by the serializers against the values() readers.")
+
+    def handle(self, *args, **options):
+        parameters = {
+            'menu_items': options['menu_items'],
+            'tables': options['tables'],
+            'orders': options['orders'],
+            'items_per_order': options['items_per_order'],
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = benchmarks.run(repeat=options['repeat'], **parameters)
+            serializers = benchmarks.compare_serializers() if options['serializers'] else {}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<30}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>9}{'peak KiB':>11}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<30}{row['queries']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['rps']:>9}{row['peak_kb']:>11}"
+            )
+
+        if serializers:
+            self.stdout.write('')
+            self.stdout.write(f"{'list payload':<38}{'serializer ms':>14}{'values ms':>11}{'speedup':>9}")
+            for name, row in serializers.items():
+                self.stdout.write(
+                    f"{name:<38}{row['serializer_ms']:>14}{row['values_ms']:>11}{row['speedup']:>8}x"
+                )
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            benchmarks.save_baseline(baseline_path, results, parameters)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        if options['no_compare'] or not baseline_path.exists():
+            return
+
+        baseline = benchmarks.load_baseline(baseline_path)
+        if baseline['parameters'] != parameters:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {json.dumps(baseline['parameters'])}; skipping comparison."
+            ))
+            return
+
+        regressions = benchmarks.compare(results, baseline['endpoints'], options['threshold'])
+        if regressions:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
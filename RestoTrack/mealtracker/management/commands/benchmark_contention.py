@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from mealtracker import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders from many threads at once against a throwaway test database under each "
+        "database profile (settings.DATABASE_PROFILES) and compare throughput and lock failures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.DATABASE_PROFILES))
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=25, help="Orders placed per thread.")
+        parser.add_argument('--menu-items', type=int, default=10,
+                            help="Size of the contended menu; fewer items means more shared stock rows.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown database profiles: {', '.join(sorted(unknown))}")
+        if connection.vendor != 'sqlite':
+            raise CommandError("The contention benchmark drives SQLite profiles only.")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = benchmarks.write_contention(
+                profiles=options['profiles'],
+                threads=options['threads'],
+                orders_per_thread=options['orders'],
+                menu_items=options['menu_items'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'profile':<12}{'placed':>8}{'failed':>8}{'orders/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<12}{row['placed']:>8}{row['failed']:>8}{row['orders_per_s']:>10}"
+                f"{str(row['p50_ms']):>10}{str(row['p95_ms']):>10}"
+            )
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from mealtracker.models import Order
+
+TOTAL_FIELDS = ('subtotal', 'tax', 'service_charge', 'total')
+
+
+class Command(BaseCommand):
+    help = "Verify stored order totals against their items, optionally rebuilding drifted orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Rewrite totals for orders that have drifted.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = (
+            Order.objects
+            .annotate(items_subtotal=Coalesce(
+                Sum('items__line_total'), Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ))
+            .values_list('pk', *TOTAL_FIELDS, 'items_subtotal')
+            .order_by()
+        )
+
+        checked = 0
+        drifted = []
+        for pk, *stored, items_subtotal in rows.iterator(chunk_size=batch_size):
+            checked += 1
+            expected = Order.totals_for(items_subtotal)
+            if [expected[field] for field in TOTAL_FIELDS] != stored:
+                drifted.append(Order(pk=pk, **expected))
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Order {pk}: stored {dict(zip(TOTAL_FIELDS, stored))}, expected {expected}")
+
+        self.stdout.write(f"Checked {checked} orders, {len(drifted)} with drifted totals.")
+        if not drifted:
+            return
+
+        if not options['rebuild']:
+            raise CommandError(f"{len(drifted)} orders have drifted totals; re-run with --rebuild to fix them.")
+
+        Order.objects.bulk_update(drifted, TOTAL_FIELDS, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {len(drifted)} orders."))
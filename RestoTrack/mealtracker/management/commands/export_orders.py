@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from mealtracker.filters import parse_moment
+from mealtracker.models import Order
+from mealtracker.services.exports import stream_orders, FORMATS
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their items as CSV or NDJSON, with constant memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--start', help="Orders created at or after this date/datetime (ISO 8601).")
+        parser.add_argument('--end', help="Orders created before this date/datetime (ISO 8601).")
+        parser.add_argument('--status', help="Comma-separated statuses to include.")
+        parser.add_argument('--output', help="File to write to (defaults to stdout).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        try:
+            if options['start']:
+                orders = orders.filter(created_at__gte=parse_moment(options['start'], 'start'))
+            if options['end']:
+                orders = orders.filter(created_at__lt=parse_moment(options['end'], 'end'))
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+        if options['status']:
+            orders = orders.filter(status__in=options['status'].split(','))
+
+        chunks = stream_orders(orders, options['format'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mealtracker.outbox import drain, purge_processed, side_effect_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Run pending side effects from the outbox (feed events, sales rollups, low stock alerts). "
+        "Use --loop to keep polling, e.g. when settings.SIDE_EFFECTS['MODE'] is 'command'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once drained.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep between polls with --loop.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Events claimed per batch.")
+        parser.add_argument('--purge', action='store_true', help="Also delete processed events past retention.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or side_effect_settings()['BATCH_SIZE']
+        while True:
+            processed = drain(batch_size)
+            if options['purge']:
+                purged = purge_processed()
+                if purged:
+                    self.stdout.write(f"Purged {purged} processed events.")
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} events."))
+                return
+            if processed:
+                self.stdout.write(f"Processed {processed} events.")
+            close_old_connections()
+            time.sleep(options['interval'])
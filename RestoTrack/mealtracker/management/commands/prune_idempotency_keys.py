@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mealtracker.idempotency import get_key_store
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys from the configured key store (settings.IDEMPOTENCY_STORE)."
+
+    def handle(self, *args, **options):
+        deleted = get_key_store().prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired idempotency keys."))
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from datetime import datetime, time, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils.dateparse import parse_date
+
+from mealtracker.models import ArchivedOrder, MenuItem, Order, OrderItem, SalesRollup, MenuItemSalesRollup
+from mealtracker.routers import branch_database
+
+TRUNCATE = {'hour': TruncHour, 'day': TruncDay}
+# SalesRollup field -> aggregate over the period's orders
+SALES_FIELDS = {'revenue': 'revenue', 'tax': 'tax_sum', 'service_charge': 'service_sum', 'total': 'total_sum'}
+
+
+class Command(BaseCommand):
+    help = "Rebuild hourly and daily sales rollups from closed orders, archived ones included."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date (YYYY-MM-DD) onwards.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Database whose orders and rollups to rebuild, e.g. a branch database from settings.BRANCH_DATABASES.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            day = parse_date(options['since'])
+            if day is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+            since = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+        orders = Order.objects.filter(status='closed').annotate(closed_at=Coalesce('completed_at', 'updated_at'))
+        items = OrderItem.objects.filter(order__status='closed').annotate(
+            closed_at=Coalesce('order__completed_at', 'order__updated_at'),
+        )
+        # Orders moved out by archive_orders still count towards their periods
+        archived = ArchivedOrder.objects.filter(status='closed').annotate(
+            closed_at=Coalesce('completed_at', 'updated_at'),
+        )
+        sales_rollups = SalesRollup.objects.all()
+        item_rollups = MenuItemSalesRollup.objects.all()
+        if since:
+            orders = orders.filter(closed_at__gte=since)
+            items = items.filter(closed_at__gte=since)
+            archived = archived.filter(closed_at__gte=since)
+            sales_rollups = sales_rollups.filter(period_start__gte=since)
+            item_rollups = item_rollups.filter(period_start__gte=since)
+
+        database = options['database']
+        with branch_database(database), transaction.atomic(using=database):
+            sales_rollups.delete()
+            item_rollups.delete()
+
+            menu_items = set(MenuItem.objects.values_list('id', flat=True))
+            for period, trunc in TRUNCATE.items():
+                sales = defaultdict(lambda: {'covers': 0, **dict.fromkeys(SALES_FIELDS, Decimal('0.00'))})
+                for source in (orders, archived):
+                    for row in (
+                        source
+                        .annotate(start=trunc('closed_at', tzinfo=dt_timezone.utc))
+                        .values('branch_id', 'start')
+                        .annotate(
+                            covers=Count('id'),
+                            revenue=Sum('subtotal'),
+                            tax_sum=Sum('tax'),
+                            service_sum=Sum('service_charge'),
+                            total_sum=Sum('total'),
+                        )
+                        .order_by()
+                    ):
+                        totals = sales[(row['branch_id'], row['start'])]
+                        totals['covers'] += row['covers']
+                        for field, column in SALES_FIELDS.items():
+                            totals[field] += row[column]
+                created = SalesRollup.objects.bulk_create([
+                    SalesRollup(branch_id=branch_id, period=period, period_start=start, **totals)
+                    for (branch_id, start), totals in sales.items()
+                ], batch_size=options['batch_size'])
+
+                sold = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.00')})
+                for row in (
+                    items
+                    .annotate(start=trunc('closed_at', tzinfo=dt_timezone.utc))
+                    .values('order__branch_id', 'start', 'menu_item_id')
+                    .annotate(sold=Sum('quantity'), line_revenue=Sum('line_total'))
+                    .order_by()
+                    .iterator(chunk_size=options['batch_size'])
+                ):
+                    line = sold[(row['order__branch_id'], row['start'], row['menu_item_id'])]
+                    line['quantity'] += row['sold']
+                    line['revenue'] += row['line_revenue']
+                # Archived lines live in each order's items JSON, and may name menu items
+                # deleted since (whose rollups were deleted with them)
+                for branch_id, start, order_items in (
+                    archived
+                    .annotate(start=trunc('closed_at', tzinfo=dt_timezone.utc))
+                    .values_list('branch_id', 'start', 'items')
+                    .iterator(chunk_size=options['batch_size'])
+                ):
+                    for item in order_items:
+                        if item['menu_item'] not in menu_items:
+                            continue
+                        line = sold[(branch_id, start, item['menu_item'])]
+                        line['quantity'] += item['quantity']
+                        line['revenue'] += Decimal(item['line_total'])
+                created_items = MenuItemSalesRollup.objects.bulk_create([
+                    MenuItemSalesRollup(
+                        branch_id=branch_id, period=period, period_start=start, menu_item_id=menu_item_id, **line,
+                    )
+                    for (branch_id, start, menu_item_id), line in sold.items()
+                ], batch_size=options['batch_size'])
+
+                self.stdout.write(f"{period}: {len(created)} sales rows, {len(created_items)} menu item rows")
+
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt."))
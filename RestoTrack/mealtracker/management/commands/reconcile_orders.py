@@ -0,0 +1,76 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from mealtracker.routers import branch_database
+from mealtracker.services.reconciliation import TOTAL_FIELDS, reconcile_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "End-of-day reconciliation: recompute the totals of a day's (or --month's) orders from "
+        "their lines, report the day's figures and fail if any stored total disagrees."
+    )
+
+    def add_arguments(self, parser):
+        period = parser.add_mutually_exclusive_group()
+        period.add_argument('--date', help="Day to reconcile, YYYY-MM-DD (default: yesterday).")
+        period.add_argument('--month', help="Month to reconcile, YYYY-MM.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Orders read per query.")
+        parser.add_argument('--show', type=int, default=20, help="Mismatches to list.")
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Database to reconcile, e.g. a branch database from settings.BRANCH_DATABASES.",
+        )
+
+    def period(self, options):
+        try:
+            if options['month']:
+                first = datetime.strptime(options['month'], '%Y-%m').date()
+                last = (first + timedelta(days=32)).replace(day=1)
+            elif options['date']:
+                first = datetime.strptime(options['date'], '%Y-%m-%d').date()
+                last = first + timedelta(days=1)
+            else:
+                last = timezone.localdate()
+                first = last - timedelta(days=1)
+        except ValueError as exc:
+            raise CommandError(exc)
+        return (
+            first,
+            timezone.make_aware(datetime.combine(first, time.min)),
+            timezone.make_aware(datetime.combine(last, time.min)),
+        )
+
+    def handle(self, *args, **options):
+        first, start, end = self.period(options)
+        with branch_database(options['database']):
+            report = reconcile_orders(start, end, chunk_size=options['chunk_size'])
+
+        label = options['month'] or f"{first:%Y-%m-%d}"
+        self.stdout.write(f"{label}: {report['orders']} orders, {report['lines']} lines")
+        for field in TOTAL_FIELDS:
+            self.stdout.write(f"  {field:<15} stored {report['stored'][field]:>14}  expected {report['expected'][field]:>14}")
+        for status, row in report['by_status'].items():
+            self.stdout.write(f"  {status:<15} {row['orders']:>6} orders  {row['total']:>14}")
+
+        mismatches, line_mismatches = report['mismatches'], report['line_mismatches']
+        for mismatch in mismatches[:options['show']]:
+            fields = ', '.join(
+                f"{field} {values['stored']} != {values['expected']}" for field, values in mismatch['fields'].items()
+            )
+            self.stdout.write(f"  Order {mismatch['order']}: {fields}")
+        for mismatch in line_mismatches[:options['show']]:
+            self.stdout.write(
+                f"  Line {mismatch['line']} (order {mismatch['order']}): "
+                f"line_total {mismatch['stored']} != {mismatch['expected']}"
+            )
+
+        if mismatches or line_mismatches:
+            raise CommandError(
+                f"{len(mismatches)} orders and {len(line_mismatches)} lines do not reconcile; "
+                "`check_order_totals --rebuild` rewrites order totals from their lines."
+            )
+        self.stdout.write(self.style.SUCCESS(f"All {report['orders']} orders reconcile."))
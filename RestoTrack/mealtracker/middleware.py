@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+DEFAULT_PROFILING = {
+    'ENABLED': False,
+    'SLOW_REQUESTS': 50,        # how many of the slowest requests to keep
+    'DUPLICATE_THRESHOLD': 5,   # identical query shapes per request before flagging N+1
+    'SERVER_TIMING': True,      # emit a Server-Timing response header
+}
+
+# Collapse "IN (%s, %s, ...)" lists so batched lookups of different sizes share a fingerprint
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def profiling_settings():
+    return {**DEFAULT_PROFILING, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts queries, DB time and repeated query shapes.
+    Parameters are not recorded, so the SQL text is already a fingerprint.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            shape = fingerprint(sql)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def duplicates(self):
+        return {shape: count for shape, count in self.shapes.items() if count > 1}
+
+
+class SlowRequestLog:
+    """
+    Thread-safe fixed-size record of the slowest requests seen by this process.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        entry = (profile['total_ms'], next(self._counter), profile)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif entry[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def entries(self):
+        with self._lock:
+            entries = list(self._heap)
+        return [profile for _, _, profile in sorted(entries, key=lambda entry: entry[0], reverse=True)]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+slow_requests = SlowRequestLog(profiling_settings()['SLOW_REQUESTS'])
+
+
+def view_name(request):
+    """
+    Resolved view and action, e.g. 'OrderViewSet.update_status'.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name
+    action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower())
+    return f"{view_class.__name__}.{action}" if action else view_class.__name__
+
+
+class QueryProfilingMiddleware:
+    """
+    Opt-in per-request profiling (settings.REQUEST_PROFILING['ENABLED']).
+
+    Records the resolved view/action, total time, DB time, query count and repeated
+    query shapes, flags likely N+1 patterns, adds a Server-Timing header and keeps the
+    slowest requests in `slow_requests`. When disabled the middleware removes itself.
+    Queries issued while a streaming response is consumed are not included.
+    """
+    def __init__(self, get_response):
+        config = profiling_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_threshold = config['DUPLICATE_THRESHOLD']
+        self.server_timing = config['SERVER_TIMING']
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+
+        duplicates = recorder.duplicates()
+        profile = {
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': view_name(request),
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'db_ms': round(db_ms, 3),
+            'queries': recorder.count,
+            'duplicates': duplicates,
+            'n_plus_one': [shape for shape, count in duplicates.items() if count >= self.duplicate_threshold],
+        }
+        slow_requests.add(profile)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'total;dur={total_ms:.3f}, db;dur={db_ms:.3f};desc="{recorder.count} queries"'
+            )
+        return response
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def claim_existing_slots(apps, schema_editor):
+    """
+    Give reservations made before slots existed an end time and their slots.
+    Overlaps that already exist in the data are kept on a first-come basis.
+    """
+    Reservation = apps.get_model('mealtracker', 'Reservation')
+    ReservationSlot = apps.get_model('mealtracker', 'ReservationSlot')
+    step = getattr(settings, 'RESERVATION_SLOT_MINUTES', 30) * 60
+    duration = timedelta(minutes=getattr(settings, 'RESERVATION_DURATION_MINUTES', 90))
+
+    for reservation in Reservation.objects.order_by('created_at').iterator():
+        reservation.end_time = reservation.reservation_time + duration
+        reservation.save(update_fields=['end_time'])
+        if reservation.status in ['cancelled', 'completed', 'no_show']:
+            continue
+        moment = int(reservation.reservation_time.timestamp()) // step * step
+        slots = []
+        while moment < reservation.end_time.timestamp():
+            slots.append(ReservationSlot(
+                reservation=reservation,
+                table_id=reservation.table_id,
+                slot_start=datetime.fromtimestamp(moment, tz=timezone.utc),
+            ))
+            moment += step
+        ReservationSlot.objects.bulk_create(slots, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0003_order_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='party_size',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['table', 'reservation_time'], name='reservation_table_time_idx'),
+        ),
+        migrations.AddField(
+            model_name='reservationslot',
+            name='reservation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='mealtracker.reservation'),
+        ),
+        migrations.AddField(
+            model_name='reservationslot',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_slots', to='mealtracker.table'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservationslot',
+            constraint=models.UniqueConstraint(fields=('table', 'slot_start'), name='unique_table_slot'),
+        ),
+        migrations.RunPython(claim_existing_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_inventory_by_name(apps, schema_editor):
+    """
+    Link existing stock rows to the menu item they were matched to by name.
+    """
+    Inventory = apps.get_model('mealtracker', 'Inventory')
+    MenuItem = apps.get_model('mealtracker', 'MenuItem')
+
+    menu_ids = {}
+    for pk, name in MenuItem.objects.order_by('-id').values_list('id', 'name'):
+        menu_ids[name] = pk
+
+    linked = []
+    for inventory in Inventory.objects.filter(menu_item__isnull=True).order_by('id'):
+        menu_item_id = menu_ids.pop(inventory.item_name, None)
+        if menu_item_id is not None:
+            inventory.menu_item_id = menu_item_id
+            linked.append(inventory)
+    Inventory.objects.bulk_update(linked, ['menu_item'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0004_reservation_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='menu_item',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory', to='mealtracker.menuitem'),
+        ),
+        migrations.RunPython(link_inventory_by_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0005_inventory_menu_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('covers', models.PositiveIntegerField(default=0, help_text='Closed orders in the period')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of order subtotals', max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('service_charge', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'ordering': ['period', 'period_start'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start'), name='unique_sales_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MenuItemSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='mealtracker.menuitem')),
+            ],
+            options={
+                'ordering': ['period', 'period_start', 'menu_item'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'menu_item'), name='unique_item_sales_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('min_threshold'))), fields=['item_name', 'id'], name='inventory_low_stock_idx'),
+        ),
+    ]
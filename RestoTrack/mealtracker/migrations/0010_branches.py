@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0009_outbox_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('code', models.SlugField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='placed_by',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='table',
+            name='number',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='inventory', to='mealtracker.branch'),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='menu_items', to='mealtracker.branch'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='mealtracker.branch'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='mealtracker.branch'),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tables', to='mealtracker.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('min_threshold'))), fields=['branch', 'item_name', 'id'], name='inventory_branch_low_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['branch', 'item_name'], name='inventory_branch_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['branch', 'id'], name='menuitem_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['branch', '-created_at', '-id'], name='order_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['branch', 'status', '-created_at'], name='order_branch_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['branch', 'reservation_time'], name='reservation_branch_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='table',
+            constraint=models.UniqueConstraint(fields=('branch', 'number'), name='unique_branch_table_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='table',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('number',), name='unique_unassigned_table_number'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:59
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0010_branches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('table_id', models.BigIntegerField(blank=True, null=True)),
+                ('placed_by_id', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('preparing', 'Preparing'), ('served', 'Served'), ('closed', 'Closed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('service_charge', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('items', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('branch', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_orders', to='mealtracker.branch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='archived_order_created_idx'), models.Index(fields=['branch', '-created_at', '-id'], name='archived_order_branch_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealtracker', '0011_order_archive'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='menuitemsalesrollup',
+            options={'ordering': ['period', 'period_start', 'branch', 'menu_item']},
+        ),
+        migrations.AlterModelOptions(
+            name='salesrollup',
+            options={'ordering': ['period', 'period_start', 'branch']},
+        ),
+        migrations.RemoveConstraint(
+            model_name='menuitemsalesrollup',
+            name='unique_item_sales_rollup',
+        ),
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='unique_sales_rollup',
+        ),
+        migrations.AddField(
+            model_name='menuitemsalesrollup',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='menu_item_sales_rollups', to='mealtracker.branch'),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales_rollups', to='mealtracker.branch'),
+        ),
+        migrations.AddConstraint(
+            model_name='menuitemsalesrollup',
+            constraint=models.UniqueConstraint(fields=('branch', 'period', 'period_start', 'menu_item'), name='unique_item_sales_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='menuitemsalesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('period', 'period_start', 'menu_item'), name='unique_unassigned_item_sales_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('branch', 'period', 'period_start'), name='unique_sales_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('period', 'period_start'), name='unique_unassigned_sales_rollup'),
+        ),
+    ]
@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F, Sum
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import uuid
 from decimal import Decimal
 
+from .cache import bump_floor_version, bump_menu_version, forget_branch
+
 
 # ✅ BASE MODEL
 
@@ -15,32 +19,102 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class InvalidatesFloorPlan:
+    """
+    Tables, orders and reservations make up the floor plan (floor.py): drop the cached
+    plan once a saved or deleted row is visible to other connections.
+    """
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(bump_floor_version, using=self._state.db)
+
+    def delete(self, *args, **kwargs):
+        using = self._state.db
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_floor_version, using=using)
+        return result
+
+
+# ✅ BRANCH MODEL
+
+class Branch(TimeStampedModel):
+    """
+    A restaurant location. Tables, menu items, stock, orders and reservations belong to
+    one; requests pick theirs with the X-Branch header (see views.BranchScopedMixin).
+    """
+    code = models.SlugField(max_length=32, unique=True)
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(lambda: forget_branch(self.code))
+
+
+def branch_field(related_name):
+    # Branch rows stay in the default database while branch data may live in another
+    # one (routers.BranchRouter), so the link is not a database-level constraint. Each
+    # model has a composite index led by the branch instead of a single-column one.
+    return models.ForeignKey(
+        Branch, on_delete=models.PROTECT, null=True, blank=True, db_constraint=False, db_index=False,
+        related_name=related_name,
+    )
+
+
 # ✅ MENU MODEL
 
 class MenuItem(TimeStampedModel):
+    branch = branch_field('menu_items')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['branch', 'id'], name='menuitem_branch_idx')]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Invalidate cached menu payloads once the change is visible to other connections
+        transaction.on_commit(bump_menu_version, using=self._state.db)
+
+    def delete(self, *args, **kwargs):
+        using = self._state.db
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_menu_version, using=using)
+        return result
+
 
 # ✅ TABLE MODEL
 
-class Table(TimeStampedModel):
-    number = models.PositiveIntegerField(unique=True)
+class Table(InvalidatesFloorPlan, TimeStampedModel):
+    branch = branch_field('tables')
+    number = models.PositiveIntegerField()
     capacity = models.PositiveIntegerField()
     is_available = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Table numbers repeat across branches but not within one
+            models.UniqueConstraint(fields=['branch', 'number'], name='unique_branch_table_number'),
+            models.UniqueConstraint(
+                fields=['number'], condition=models.Q(branch__isnull=True), name='unique_unassigned_table_number',
+            ),
+        ]
+
     def __str__(self):
         return f"Table {self.number}"
 
 
 # ✅ ORDER MODEL
 
-class Order(TimeStampedModel):
+class Order(InvalidatesFloorPlan, TimeStampedModel):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('preparing', 'Preparing'),
@@ -48,10 +122,22 @@ class Order(TimeStampedModel):
         ('closed', 'Closed'),
         ('cancelled', 'Cancelled'),
     ]
+    # Allowed status changes; closed and cancelled orders are final
+    TRANSITIONS = {
+        'pending': ['preparing', 'served', 'closed', 'cancelled'],
+        'preparing': ['pending', 'served', 'closed', 'cancelled'],
+        'served': ['preparing', 'closed', 'cancelled'],
+        'closed': [],
+        'cancelled': [],
+    }
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    branch = branch_field('orders')
     table = models.ForeignKey(Table, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
-    placed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='orders')
+    # Users live in the default database, which need not be the order's
+    placed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, db_constraint=False, related_name='orders',
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
     subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
@@ -62,27 +148,80 @@ class Order(TimeStampedModel):
     note = models.TextField(blank=True, null=True)
     completed_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Supports newest-first keyset pagination of the order list
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # Back the status / table / placed_by filters on the order list
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['table', '-created_at'], name='order_table_created_idx'),
+            models.Index(fields=['placed_by', '-created_at'], name='order_user_created_idx'),
+            # Kitchen and floor screens poll only the open tickets
+            models.Index(
+                fields=['-created_at'],
+                name='order_open_created_idx',
+                condition=models.Q(status__in=['pending', 'preparing']),
+            ),
+            # Branch-scoped lists: the branch leads, so a location's orders cost the
+            # same to page through however many locations share the table
+            models.Index(fields=['branch', '-created_at', '-id'], name='order_branch_created_idx'),
+            models.Index(fields=['branch', 'status', '-created_at'], name='order_branch_status_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
-    def calculate_totals(self, tax_rate=Decimal('0.075'), service_rate=Decimal('0.10')):
-        items = self.items.all()
-        subtotal = sum((item.line_total for item in items), Decimal('0.00'))
+    @staticmethod
+    def rates():
+        """
+        The (tax, service charge) rates from settings.ORDER_TAX_RATE / ORDER_SERVICE_RATE.
+        """
+        return (
+            Decimal(str(getattr(settings, 'ORDER_TAX_RATE', '0.075'))),
+            Decimal(str(getattr(settings, 'ORDER_SERVICE_RATE', '0.10'))),
+        )
+
+    @staticmethod
+    def totals_for(subtotal, tax_rate=None, service_rate=None):
+        """
+        Derive tax, service charge and total from a subtotal without touching the database.
+        """
+        default_tax_rate, default_service_rate = Order.rates()
+        tax_rate = default_tax_rate if tax_rate is None else tax_rate
+        service_rate = default_service_rate if service_rate is None else service_rate
         tax = (subtotal * tax_rate).quantize(Decimal('0.01'))
         service_charge = (subtotal * service_rate).quantize(Decimal('0.01'))
         total = (subtotal + tax + service_charge).quantize(Decimal('0.01'))
-
-        self.subtotal = subtotal
-        self.tax = tax
-        self.service_charge = service_charge
-        self.total = total
-        return total
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Automatically recalculate totals after saving
-        self.calculate_totals()
-        super().save(update_fields=['subtotal', 'tax', 'service_charge', 'total'])
+        return {'subtotal': subtotal, 'tax': tax, 'service_charge': service_charge, 'total': total}
+
+    def calculate_totals(self, tax_rate=None, service_rate=None):
+        subtotal = self.items.aggregate(subtotal=Sum('line_total'))['subtotal'] or Decimal('0.00')
+        totals = self.totals_for(subtotal, tax_rate, service_rate)
+
+        self.subtotal = totals['subtotal']
+        self.tax = totals['tax']
+        self.service_charge = totals['service_charge']
+        self.total = totals['total']
+        return self.total
+
+    @classmethod
+    def apply_subtotal_delta(cls, order_id, delta):
+        """
+        Shift an order's subtotal by `delta` with an atomic F() update, then derive tax,
+        service charge and total from the stored result. Cost is constant in the number of items.
+        """
+        with transaction.atomic(using=router.db_for_write(cls)):
+            orders = cls.objects.filter(pk=order_id)
+            orders.update(subtotal=F('subtotal') + delta)
+            subtotal = orders.values_list('subtotal', flat=True).get()
+            totals = cls.totals_for(subtotal)
+            orders.update(
+                tax=totals['tax'],
+                service_charge=totals['service_charge'],
+                total=totals['total'],
+                updated_at=timezone.now(),
+            )
+        return totals
 
 
 # ✅ ORDER ITEM MODEL
@@ -98,38 +237,295 @@ class OrderItem(TimeStampedModel):
     class Meta:
         indexes = [models.Index(fields=['order', 'menu_item'])]
 
+    # line_total / order as last written to the database, used to compute subtotal deltas
+    _stored_line_total = Decimal('0.00')
+    _stored_order_id = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stored_state()
+        return instance
+
+    def _remember_stored_state(self):
+        self._stored_line_total = self.line_total
+        self._stored_order_id = self.order_id
+
+    def _apply_to_order(self, order_id, delta):
+        if not delta:
+            return
+        totals = Order.apply_subtotal_delta(order_id, delta)
+        # Keep an already loaded parent order in sync with the database
+        if self._meta.get_field('order').is_cached(self) and self.order.pk == order_id:
+            for field, value in totals.items():
+                setattr(self.order, field, value)
+
+    def fill_prices(self):
+        if not self.unit_price:
+            from .pricing import price_book  # pricing imports models
+
+            entry = price_book().get(self.menu_item_id)
+            self.unit_price = entry.price if entry is not None else self.menu_item.price
+        self.line_total = (self.unit_price * self.quantity).quantize(Decimal('0.01'))
+
     def save(self, *args, **kwargs):
         # Auto update line_total when saving
-        self.unit_price = self.unit_price or self.menu_item.price
-        self.line_total = (self.unit_price * self.quantity).quantize(Decimal('0.01'))
-        super().save(*args, **kwargs)
-        # Update order totals after saving item
-        self.order.calculate_totals()
-        self.order.save(update_fields=['subtotal', 'tax', 'service_charge', 'total'])
+        self.fill_prices()
+        with transaction.atomic(using=router.db_for_write(OrderItem, instance=self)):
+            super().save(*args, **kwargs)
+            # Apply only the difference to the order instead of re-summing every item
+            if self._stored_order_id is not None and self._stored_order_id != self.order_id:
+                self._apply_to_order(self._stored_order_id, -self._stored_line_total)
+                self._apply_to_order(self.order_id, self.line_total)
+            else:
+                self._apply_to_order(self.order_id, self.line_total - self._stored_line_total)
+        self._remember_stored_state()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=router.db_for_write(OrderItem, instance=self)):
+            result = super().delete(*args, **kwargs)
+            self._apply_to_order(self._stored_order_id, -self._stored_line_total)
+        self._stored_line_total = Decimal('0.00')
+        self._stored_order_id = None
+        return result
 
     def __str__(self):
         return f"{self.menu_item.name} x {self.quantity} (Order {self.order_id})"
 
 
+# ✅ ORDER ARCHIVE MODEL
+
+class ArchivedOrder(models.Model):
+    """
+    A closed or cancelled order moved out of the live tables by `manage.py archive_orders`,
+    with its lines stored inline in `items`. Table, user and menu item ids are kept as
+    plain values: the rows they pointed at may be gone by the time the order is read.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    branch = branch_field('archived_orders')
+    table_id = models.BigIntegerField(null=True, blank=True)
+    placed_by_id = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    tax = models.DecimalField(max_digits=12, decimal_places=2)
+    service_charge = models.DecimalField(max_digits=12, decimal_places=2)
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    note = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    items = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='archived_order_created_idx'),
+            models.Index(fields=['branch', '-created_at', '-id'], name='archived_order_branch_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.status}"
+
+
 # ✅ RESERVATION MODEL
 
-class Reservation(TimeStampedModel):
+class Reservation(InvalidatesFloorPlan, TimeStampedModel):
+    # Statuses that give the table's time slots back
+    RELEASED_STATUSES = ['cancelled', 'completed', 'no_show']
+
+    branch = branch_field('reservations')
     table = models.ForeignKey(Table, on_delete=models.CASCADE)
     customer_name = models.CharField(max_length=100)
     customer_phone = models.CharField(max_length=20)
+    party_size = models.PositiveIntegerField(default=1)
     reservation_time = models.DateTimeField()
+    end_time = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=50, default='pending')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['table', 'reservation_time'], name='reservation_table_time_idx'),
+            models.Index(fields=['branch', 'reservation_time'], name='reservation_branch_time_idx'),
+        ]
+
     def __str__(self):
         return f"Reservation for {self.customer_name} at {self.reservation_time}"
 
 
+class ReservationSlot(models.Model):
+    """
+    One row per table and booked time slot. The unique constraint on (table, slot_start)
+    makes overlapping bookings of a table impossible, even for concurrent requests.
+    """
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='slots')
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='reservation_slots')
+    slot_start = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['table', 'slot_start'], name='unique_table_slot')]
+
+    def __str__(self):
+        return f"Table {self.table_id} at {self.slot_start}"
+
+
 # ✅ INVENTORY MODEL
 
 class Inventory(TimeStampedModel):
+    branch = branch_field('inventory')
+    menu_item = models.OneToOneField(
+        MenuItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory',
+    )
     item_name = models.CharField(max_length=100)
     quantity = models.PositiveIntegerField(default=0)
     min_threshold = models.PositiveIntegerField(default=5)
 
+    class Meta:
+        indexes = [
+            # Only low rows are indexed, so listing them stays cheap however many SKUs are healthy
+            models.Index(
+                fields=['item_name', 'id'],
+                name='inventory_low_stock_idx',
+                condition=models.Q(quantity__lte=F('min_threshold')),
+            ),
+            models.Index(
+                fields=['branch', 'item_name', 'id'],
+                name='inventory_branch_low_idx',
+                condition=models.Q(quantity__lte=F('min_threshold')),
+            ),
+            models.Index(fields=['branch', 'item_name'], name='inventory_branch_name_idx'),
+        ]
+
     def __str__(self):
         return self.item_name
+
+    @classmethod
+    def low_stock(cls):
+        """
+        Rows at or below their threshold; the filter matches the partial index condition.
+        """
+        return cls.objects.filter(quantity__lte=F('min_threshold'))
+
+
+# ✅ SALES ROLLUP MODELS
+
+class SalesRollup(models.Model):
+    """
+    Closed-order totals per branch per hour or day, keyed by the period in which orders
+    were completed.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    branch = branch_field('sales_rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    covers = models.PositiveIntegerField(default=0, help_text="Closed orders in the period")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'),
+                                  help_text="Sum of order subtotals")
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    service_charge = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'period', 'period_start'], name='unique_sales_rollup'),
+            # NULLs never conflict, so rows outside any branch need their own key
+            models.UniqueConstraint(
+                fields=['period', 'period_start'], condition=models.Q(branch__isnull=True),
+                name='unique_unassigned_sales_rollup',
+            ),
+        ]
+        ordering = ['period', 'period_start', 'branch']
+
+    def __str__(self):
+        return f"{self.get_period_display()} from {self.period_start}"
+
+
+class MenuItemSalesRollup(models.Model):
+    """
+    Quantity and line revenue sold per menu item per branch per hour or day.
+    """
+    branch = branch_field('menu_item_sales_rollups')
+    period = models.CharField(max_length=4, choices=SalesRollup.PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='sales_rollups')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['branch', 'period', 'period_start', 'menu_item'], name='unique_item_sales_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'menu_item'], condition=models.Q(branch__isnull=True),
+                name='unique_unassigned_item_sales_rollup',
+            ),
+        ]
+        ordering = ['period', 'period_start', 'branch', 'menu_item']
+
+    def __str__(self):
+        return f"{self.menu_item_id} {self.get_period_display()} from {self.period_start}"
+
+
+# ✅ IDEMPOTENCY KEY MODEL
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a request sent with an Idempotency-Key header, used by
+    mealtracker.idempotency.DatabaseKeyStore. `response_status` is empty while the
+    first request is still running.
+    """
+    scope = models.CharField(max_length=255, help_text="Endpoint and user the key belongs to")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="Hash of the request body")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key')]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+
+
+# ✅ OUTBOX MODEL
+
+class OutboxEvent(models.Model):
+    """
+    A side effect recorded in the same transaction as the write that caused it and
+    carried out afterwards by mealtracker.outbox workers.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set while a worker holds the event; `available_at` is pushed out for the lease
+    claim = models.UUIDField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_pending_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['claim'], name='outbox_claim_idx', condition=models.Q(claim__isnull=False)),
+            models.Index(fields=['status', 'processed_at'], name='outbox_status_processed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.status})"
@@ -0,0 +1,222 @@
+"""
+Transactional outbox for side effects. Writes record OutboxEvent rows in their own
+transaction; once it commits the rows are handled in batches, per topic, by the
+handlers registered with @handles (see handlers.py), either by in-process worker
+threads or by `manage.py process_outbox`. Each branch database keeps its own outbox
+next to the rows its events describe.
+"""
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router, transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .routers import branch_database, branch_databases
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIDE_EFFECTS = {
+    'MODE': 'thread',           # 'thread': in-process workers woken on commit; 'command': process_outbox only
+    'WORKERS': 2,
+    'BATCH_SIZE': 200,
+    'LEASE_SECONDS': 60,        # how long a claimed batch is hidden from other workers
+    'MAX_ATTEMPTS': 5,          # failed events are retried with exponential backoff up to this many times
+    'POLL_SECONDS': 30,         # thread workers also look for due retries this often
+    'RETENTION_HOURS': 72,      # processed events older than this are purged
+}
+
+_handlers = defaultdict(list)
+
+
+def side_effect_settings():
+    return {**DEFAULT_SIDE_EFFECTS, **getattr(settings, 'SIDE_EFFECTS', {})}
+
+
+def handles(*topics):
+    """
+    Register a handler for topics. It is called with a list of event payloads and
+    runs in a transaction together with marking those events done.
+    """
+    def register(handler):
+        for topic in topics:
+            _handlers[topic].append(handler)
+        return handler
+    return register
+
+
+def record_events(topic, payloads):
+    """
+    Record side effects for the current transaction; they run only if it commits.
+    """
+    if not payloads:
+        return
+    OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for payload in payloads])
+    if side_effect_settings()['MODE'] == 'thread':
+        transaction.on_commit(get_workers().wake, using=router.db_for_write(OutboxEvent))
+
+
+def claim_batch(batch_size, lease):
+    """
+    Take up to `batch_size` due events for this worker, oldest first. The conditional
+    UPDATE means two workers never claim the same event.
+    """
+    now = timezone.now()
+    due = OutboxEvent.objects.filter(status='pending', available_at__lte=now)
+    ids = list(due.order_by('available_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    due.filter(id__in=ids).update(claim=token, available_at=now + lease)
+    return list(OutboxEvent.objects.filter(claim=token).order_by('id'))
+
+
+class LeaseExpired(Exception):
+    """
+    A batch's lease ran out and another worker claimed some of its events before it finished.
+    """
+
+
+def fail(events, error, max_attempts):
+    """
+    Schedule a retry for the events of a failed batch, or give up on them after
+    `max_attempts`. Events another worker has claimed since are left to that worker.
+    """
+    now = timezone.now()
+    with transaction.atomic(using=router.db_for_write(OutboxEvent)):
+        held = set(
+            OutboxEvent.objects.select_for_update()
+            .filter(id__in=[event.id for event in events], claim=events[0].claim)
+            .values_list('id', flat=True)
+        )
+        events = [event for event in events if event.id in held]
+        for event in events:
+            event.attempts += 1
+            event.claim = None
+            event.last_error = error
+            if event.attempts >= max_attempts:
+                event.status = 'failed'
+            else:
+                event.available_at = now + timedelta(seconds=2 ** event.attempts)
+        OutboxEvent.objects.bulk_update(events, ['attempts', 'claim', 'last_error', 'status', 'available_at'])
+
+
+def process_batch(batch_size=None, database=DEFAULT_DB_ALIAS):
+    """
+    Claim one batch from `database` and run its handlers topic by topic, with that
+    database active for their queries. Returns how many events were claimed. A failing
+    topic is retried later without holding back the others.
+    """
+    with branch_database(database):
+        return run_batch(batch_size, database)
+
+
+def run_batch(batch_size, database):
+    config = side_effect_settings()
+    events = claim_batch(batch_size or config['BATCH_SIZE'], timedelta(seconds=config['LEASE_SECONDS']))
+
+    by_topic = defaultdict(list)
+    for event in events:
+        by_topic[event.topic].append(event)
+
+    for topic, topic_events in by_topic.items():
+        try:
+            with transaction.atomic(using=database):
+                payloads = [event.payload for event in topic_events]
+                for handler in _handlers.get(topic, []):
+                    handler(payloads)
+                # Only events this batch still holds; if the lease ran out and another
+                # worker claimed any of them, the handlers' writes are rolled back and
+                # that worker's run counts them instead
+                marked = OutboxEvent.objects.filter(
+                    id__in=[event.id for event in topic_events], claim=topic_events[0].claim,
+                ).update(status='done', claim=None, processed_at=timezone.now())
+                if marked < len(topic_events):
+                    raise LeaseExpired(f"{len(topic_events) - marked} of {len(topic_events)} {topic} events were reclaimed")
+        except LeaseExpired as exc:
+            logger.warning("Side effects for %s rolled back: %s", topic, exc)
+        except Exception as exc:
+            logger.exception("Side effects for %s failed (%d events)", topic, len(topic_events))
+            fail(topic_events, repr(exc), config['MAX_ATTEMPTS'])
+    return len(events)
+
+
+def drain(batch_size=None):
+    """
+    Process batches from every database until nothing is due; returns the number of
+    events handled.
+    """
+    total = 0
+    for database in branch_databases():
+        while processed := process_batch(batch_size, database):
+            total += processed
+    return total
+
+
+def purge_processed(before=None):
+    before = before or timezone.now() - timedelta(hours=side_effect_settings()['RETENTION_HOURS'])
+    deleted = 0
+    for database in branch_databases():
+        deleted += OutboxEvent.objects.using(database).filter(status='done', processed_at__lt=before).delete()[0]
+    return deleted
+
+
+class WorkerPool:
+    """
+    Daemon threads that drain the outbox when woken after a commit, and every
+    POLL_SECONDS to pick up retries. Started lazily by the first wake.
+    """
+    def __init__(self, size, poll_seconds):
+        self.size = size
+        self.poll_seconds = poll_seconds
+        self._wakeup = threading.Condition()
+        self._pending_wakes = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.size):
+                thread = threading.Thread(target=self._run, name=f'outbox-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self.start()
+        with self._wakeup:
+            self._pending_wakes += 1
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if not self._pending_wakes:
+                    self._wakeup.wait(self.poll_seconds)
+                self._pending_wakes = 0
+            close_old_connections()
+            try:
+                drain()
+            except Exception:
+                logger.exception("Outbox worker failed")
+            finally:
+                # Idle workers hold no connections
+                connections.close_all()
+
+
+_workers = None
+_workers_lock = threading.Lock()
+
+
+def get_workers():
+    global _workers
+    if _workers is None:
+        with _workers_lock:
+            if _workers is None:
+                config = side_effect_settings()
+                _workers = WorkerPool(config['WORKERS'], config['POLL_SECONDS'])
+    return _workers
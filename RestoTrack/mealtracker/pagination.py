@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination for order listings: each page is a range scan on the
+    (created_at, id) index instead of an OFFSET over the whole order history.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class LowStockCursorPagination(CursorPagination):
+    """
+    Walks the low-stock partial index in (item_name, id) order.
+    """
+    ordering = ('item_name', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
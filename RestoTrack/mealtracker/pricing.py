@@ -0,0 +1,71 @@
+"""
+In-process price book: every menu item's price, name, availability and branch, read
+with one query and kept until the menu version moves (MenuItem.save / delete bump it
+on commit) or it is PRICE_BOOK_MAX_AGE seconds old, so a change made in a process that
+does not share this one's cache still arrives. Order placement prices and checks its lines against the book, so placing
+an order does not read the menu table; the price taken from the book is stored on the
+order line.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import router
+
+from .cache import menu_version
+from .models import MenuItem
+
+Price = namedtuple('Price', ['menu_item_id', 'name', 'price', 'available', 'branch_id'])
+
+
+class PriceBook:
+    def __init__(self, version, prices):
+        self.version = version
+        self.prices = prices
+        self.loaded_at = time.monotonic()
+
+    def is_current(self, version):
+        max_age = getattr(settings, 'PRICE_BOOK_MAX_AGE', 60)
+        return self.version == version and time.monotonic() - self.loaded_at < max_age
+
+    @classmethod
+    def load(cls, version, using):
+        rows = MenuItem.objects.using(using).values_list('id', 'name', 'price', 'available', 'branch_id')
+        return cls(version, {row[0]: Price(*row) for row in rows.iterator()})
+
+    def get(self, menu_item_id, branch=None):
+        """
+        The entry for a menu item, or None when it does not exist (or, given a branch,
+        belongs to another branch).
+        """
+        entry = self.prices.get(menu_item_id)
+        if entry is None or (branch is not None and entry.branch_id != branch.pk):
+            return None
+        return entry
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+
+def price_book(using=None, refresh=False):
+    """
+    The price book for the database menu items are written to, reloaded when the menu
+    version has moved since it was read, when it has reached PRICE_BOOK_MAX_AGE, or on
+    `refresh`.
+    """
+    using = using or router.db_for_write(MenuItem)
+    version = menu_version()
+    book = _books.get(using)
+    if refresh or book is None or not book.is_current(version):
+        with _books_lock:
+            book = _books.get(using)
+            if refresh or book is None or not book.is_current(version):
+                book = _books[using] = PriceBook.load(version, using)
+    return book
+
+
+def clear_price_books():
+    with _books_lock:
+        _books.clear()
@@ -0,0 +1,150 @@
+"""
+Lean read path for list endpoints: rows come straight from `.values()` and are turned
+into the same representation the serializers produce, using a field map compiled once
+per serializer, so no serializer or field objects are built per instance.
+"""
+from collections import defaultdict
+from functools import cached_property
+
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .models import OrderItem
+from .serializers import (
+    MenuItemSerializer, TableSerializer, InventorySerializer, OrderItemSerializer, OrderSerializer,
+    ArchivedOrderSerializer,
+)
+
+
+def datetime_representation(value, tz):
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def converter_for(field):
+    """
+    The conversion a serializer field applies on output as a `(value, tz)` function,
+    or None for identity.
+    """
+    if isinstance(field, serializers.DecimalField):
+        return lambda value, tz: format(value, 'f')
+    if isinstance(field, serializers.DateTimeField):
+        return datetime_representation
+    if isinstance(field, (serializers.DateField, serializers.TimeField)):
+        return lambda value, tz: value.isoformat()
+    if isinstance(field, serializers.UUIDField):
+        return lambda value, tz: str(value)
+    return None
+
+
+def requested_fields(request, available):
+    """
+    Parse ?fields=id,name,price into a tuple, or None when absent.
+    """
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}."})
+    return fields
+
+
+class RowReader:
+    """
+    Mirrors a ModelSerializer's output from `.values()` rows.
+
+    `related` maps nested serializer fields that follow a foreign key to the reader for
+    the related model, e.g. {'table_detail': table_reader}; they are read through a join
+    in the same query. To-many nested fields are left to the caller.
+    """
+    def __init__(self, serializer_class, related=None):
+        self.serializer_class = serializer_class
+        self.related = related or {}
+        self._plans = {}
+
+    @cached_property
+    def columns(self):
+        columns = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.related:
+                columns.append((name, field.source, self.related[name]))
+            elif not isinstance(field, serializers.BaseSerializer):
+                columns.append((name, field.source, converter_for(field)))
+        return columns
+
+    @property
+    def field_names(self):
+        return [name for name, _, _ in self.columns]
+
+    def compile(self, fields=None):
+        """
+        Return (lookups, represent): the `.values()` lookups to select and a function
+        that turns the resulting rows into representations, limited to `fields` if given.
+        """
+        if fields not in self._plans:
+            lookups, build = self.plan(fields)
+
+            def represent(rows):
+                # Resolved once per response; it is a context-local lookup
+                tz = timezone.get_current_timezone()
+                return [build(row, tz) for row in rows]
+
+            self._plans[fields] = (lookups, represent)
+        return self._plans[fields]
+
+    def plan(self, fields=None, prefix=''):
+        """
+        Lookups and a per-row `build(row, tz)` for the selected fields, with every
+        lookup prefixed by `prefix` when read through a relation.
+        """
+        lookups, steps = [], []
+        for name, source, convert in self.columns:
+            if fields is not None and name not in fields:
+                continue
+            lookup = prefix + source
+            lookups.append(lookup)
+            if isinstance(convert, RowReader):
+                nested_lookups, nested_build = convert.plan(prefix=f'{lookup}__')
+                lookups.extend(nested_lookups)
+                steps.append((name, lookup, nested_build, True))
+            else:
+                steps.append((name, lookup, convert, False))
+
+        def build(row, tz):
+            output = {}
+            for name, lookup, convert, nested in steps:
+                value = row[lookup]
+                if value is None or convert is None:
+                    output[name] = value
+                else:
+                    output[name] = convert(row, tz) if nested else convert(value, tz)
+            return output
+
+        return list(dict.fromkeys(lookups)), build
+
+
+menu_reader = RowReader(MenuItemSerializer)
+table_reader = RowReader(TableSerializer)
+inventory_reader = RowReader(InventorySerializer)
+order_item_reader = RowReader(OrderItemSerializer, related={'menu_item_detail': menu_reader})
+order_reader = RowReader(OrderSerializer, related={'table_detail': table_reader})
+archived_order_reader = RowReader(ArchivedOrderSerializer)
+
+
+def attach_order_items(orders, order_ids):
+    """
+    Fill each order's 'items' with one query for all of them.
+    """
+    lookups, represent = order_item_reader.compile()
+    rows = list(OrderItem.objects.filter(order_id__in=order_ids).values('order_id', *lookups))
+    items = defaultdict(list)
+    for row, item in zip(rows, represent(rows)):
+        items[row['order_id']].append(item)
+    for order, order_id in zip(orders, order_ids):
+        order['items'] = items[order_id]
+    return orders
@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_branch_database = ContextVar('branch_database', default=None)
+
+# mealtracker models kept in 'default' whichever branch is active
+SHARED_MODELS = {'branch', 'idempotencykey'}
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads made inside this block go to the read replica, if one is configured.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def branch_database(alias):
+    """
+    Send branch data read or written inside this block to database `alias`.
+    """
+    token = _branch_database.set(alias)
+    try:
+        yield
+    finally:
+        _branch_database.reset(token)
+
+
+def branch_alias(code):
+    """
+    The database holding a branch's rows. settings.BRANCH_DATABASES maps database aliases
+    to the branch codes they hold; branches not listed live in 'default'.
+    """
+    for alias, codes in getattr(settings, 'BRANCH_DATABASES', {}).items():
+        if code in codes:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def branch_databases():
+    """
+    'default' followed by every database that holds branches.
+    """
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS, *getattr(settings, 'BRANCH_DATABASES', {})]))
+
+
+def is_branch_data(model):
+    return model._meta.app_label == 'mealtracker' and model._meta.model_name not in SHARED_MODELS
+
+
+def replica_alias():
+    alias = getattr(settings, 'DATABASE_REPLICA', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class BranchRouter:
+    """
+    Routes mealtracker's operational tables to the database of the active branch
+    (`branch_database()`, entered per request by BranchScopedMixin). Branches,
+    idempotency keys and other apps' tables always use 'default', as does everything
+    while no branch database is active, so the routers after this one still apply.
+    Branch databases get only the mealtracker tables.
+    """
+
+    def db_for(self, model, hints):
+        if not is_branch_data(model):
+            return None
+        alias = _branch_database.get()
+        if alias and alias != DEFAULT_DB_ALIAS:
+            return alias
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, DEFAULT_DB_ALIAS, replica_alias()):
+            return instance._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self.db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db == obj2._state.db:
+            return True
+        # Users and branches are shared, so every branch database may point at them
+        if not is_branch_data(type(obj1)) or not is_branch_data(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != DEFAULT_DB_ALIAS and db in branch_databases():
+            return app_label == 'mealtracker' and model_name not in SHARED_MODELS
+        return None
+
+
+class ReadReplicaRouter:
+    """
+    Routes reads to settings.DATABASE_REPLICA only inside `replica_reads()` and never
+    within a transaction on the primary, so writes and read-modify-write paths
+    (order placement, stock reservation) always see their own changes. Everything
+    else, including migrations, uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
@@ -1,8 +1,11 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
 from django.contrib.auth import get_user_model
-from django.db import transaction
-from decimal import Decimal
-from .models import MenuItem, Table, Inventory, Order, OrderItem, Reservation
+from .authentication import ClaimsRefreshToken
+from .models import (
+    ArchivedOrder, MenuItem, Table, Inventory, Order, OrderItem, Reservation, SalesRollup, MenuItemSalesRollup,
+)
+from .services.orders import place_order, OrderPlacementError
 
 User = get_user_model()
 
@@ -30,9 +33,28 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class LoginSerializer(serializers.Serializer):
-    email = serializers.EmailField()
-    password = serializers.CharField(write_only=True, min_length=8)
+class LoginSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """
+    Issues a token pair whose access token carries the claims permission checks need.
+    """
+    token_class = ClaimsRefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+# -----------------------------
+# ✅ BRANCH
+# -----------------------------
+class CurrentBranchDefault:
+    """
+    The branch the view is scoped to (views.BranchScopedMixin), or None.
+    """
+    requires_context = True
+
+    def __call__(self, serializer_field):
+        return getattr(serializer_field.context.get('view'), 'branch', None)
 
 
 # -----------------------------
@@ -42,12 +64,16 @@ class MenuItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = MenuItem
         fields = '__all__'
+        read_only_fields = ['branch']
 
 
 class TableSerializer(serializers.ModelSerializer):
     class Meta:
         model = Table
         fields = '__all__'
+        read_only_fields = ['branch']
+        # Table numbers are unique per branch, so validate against the request's branch
+        extra_kwargs = {'branch': {'default': CurrentBranchDefault()}}
 
 
 # -----------------------------
@@ -57,6 +83,7 @@ class InventorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Inventory
         fields = '__all__'
+        read_only_fields = ['branch']
 
 
 # -----------------------------
@@ -68,6 +95,27 @@ class ReservationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = '__all__'
+        read_only_fields = ['branch', 'end_time']
+
+
+class TableAvailabilitySerializer(serializers.Serializer):
+    time = serializers.DateTimeField()
+    party_size = serializers.IntegerField(min_value=1)
+
+
+# -----------------------------
+# ✅ SALES ANALYTICS SERIALIZERS
+# -----------------------------
+class SalesRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SalesRollup
+        fields = ['branch', 'period', 'period_start', 'covers', 'revenue', 'tax', 'service_charge', 'total']
+
+
+class MenuItemSalesRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuItemSalesRollup
+        fields = ['branch', 'period', 'period_start', 'menu_item', 'quantity', 'revenue']
 
 
 # -----------------------------
@@ -88,10 +136,26 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'id', 'table', 'table_detail', 'placed_by', 'status',
+            'id', 'branch', 'table', 'table_detail', 'placed_by', 'status',
             'subtotal', 'tax', 'service_charge', 'total', 'note', 'created_at', 'items'
         ]
-        read_only_fields = ['subtotal', 'tax', 'service_charge', 'total', 'created_at']
+        read_only_fields = ['branch', 'subtotal', 'tax', 'service_charge', 'total', 'created_at']
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """
+    An archived order in the shape of the live order, minus the table details; each item
+    carries the menu item's name from when the order was archived.
+    """
+    table = serializers.IntegerField(source='table_id', read_only=True)
+    placed_by = serializers.IntegerField(source='placed_by_id', read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'branch', 'table', 'placed_by', 'status', 'subtotal', 'tax', 'service_charge', 'total',
+            'note', 'created_at', 'completed_at', 'archived_at', 'items',
+        ]
 
 
 # -----------------------------
@@ -99,57 +163,49 @@ class OrderSerializer(serializers.ModelSerializer):
 # -----------------------------
 
 class OrderItemCreateSerializer(serializers.Serializer):
-    menu_item_id = serializers.UUIDField()
+    menu_item_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
 
 
 
+class StockShortfall(exceptions.APIException):
+    """
+    400 for an order stock cannot cover. Unlike ValidationError, the detail keeps its
+    values' types, so the shortfall report's ids and quantities stay integers.
+    """
+    status_code = 400
+    default_code = 'invalid'
+
+    def __init__(self, detail):
+        self.detail = detail
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderItemCreateSerializer(many=True, write_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'table', 'status', 'items']
-        read_only_fields = ['id']
+        fields = ['id', 'table', 'status', 'note', 'items', 'subtotal', 'tax', 'service_charge', 'total']
+        # New orders start as pending; status moves through the update endpoints
+        read_only_fields = ['id', 'status', 'subtotal', 'tax', 'service_charge', 'total']
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("An order needs at least one item.")
+        return value
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = self.context['request'].user
 
-        with transaction.atomic():
-            order = Order.objects.create(placed_by=user, **validated_data)
-            total = Decimal('0.00')
-
-            for item in items_data:
-                menu_item = MenuItem.objects.select_for_update().get(id=item['menu_item_id'])
-                qty = item['quantity']
-                unit_price = menu_item.price
-
-                # --- Inventory check ---
-                try:
-                    inventory = Inventory.objects.select_for_update().get(item_name=menu_item.name)
-                    if inventory.quantity < qty:
-                        raise serializers.ValidationError(
-                            f"Not enough stock for {menu_item.name}. Available: {inventory.quantity}"
-                        )
-                    inventory.quantity -= qty
-                    inventory.save()
-                except Inventory.DoesNotExist:
-                    raise serializers.ValidationError(f"No inventory record found for {menu_item.name}")
-
-                # --- Create OrderItem ---
-                line_total = (unit_price * qty).quantize(Decimal('0.01'))
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=menu_item,
-                    quantity=qty,
-                    unit_price=unit_price,
-                    line_total=line_total
-                )
-
-                total += line_total
-
-            order.calculate_totals()
-            order.save()
-
-        return order
+        try:
+            return place_order(user, items_data, **validated_data)
+        except OrderPlacementError as exc:
+            if exc.shortfalls:
+                raise StockShortfall({'items': exc.errors, 'shortfalls': exc.shortfalls})
+            raise serializers.ValidationError({'items': exc.errors})
+
+
+class OrderStatusBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from ..models import OrderItem, SalesRollup, MenuItemSalesRollup
+
+PERIODS = [period for period, _ in SalesRollup.PERIOD_CHOICES]
+ORDER_FIELDS = {'revenue': 'subtotal', 'tax': 'tax', 'service_charge': 'service_charge', 'total': 'total'}
+
+
+def period_start(moment, period):
+    """
+    Start of the UTC hour or day containing `moment`.
+    """
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def increment(model, deltas, key_fields, value_fields):
+    """
+    Add `deltas` ({key tuple: {field: amount}}) onto rollup rows, creating missing rows
+    first. Costs two queries however many rows are touched.
+    """
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas],
+        ignore_conflicts=True,
+    )
+    matches = {key: Q(**dict(zip(key_fields, key))) for key in deltas}
+    updates = {}
+    for field, output_field in value_fields.items():
+        updates[field] = Case(
+            *[
+                When(matches[key], then=F(field) + Value(values[field], output_field=output_field))
+                for key, values in deltas.items()
+            ],
+            default=F(field),
+            output_field=output_field,
+        )
+    condition = Q()
+    for match in matches.values():
+        condition |= match
+    model.objects.filter(condition).update(**updates)
+
+
+def record_closed_orders(orders):
+    """
+    Fold newly closed orders into their branch's hourly and daily rollups. Every order
+    must have `completed_at` set and be counted exactly once, when it enters 'closed'.
+    """
+    orders = list(orders)
+    if not orders:
+        return
+
+    buckets = {}
+    branches = {}
+    sales = defaultdict(lambda: {'covers': 0, **{field: Decimal('0.00') for field in ORDER_FIELDS}})
+    for order in orders:
+        completed_at = order.completed_at or timezone.now()
+        buckets[order.pk] = {period: period_start(completed_at, period) for period in PERIODS}
+        branches[order.pk] = order.branch_id
+        for period, start in buckets[order.pk].items():
+            row = sales[(order.branch_id, period, start)]
+            row['covers'] += 1
+            for field, source in ORDER_FIELDS.items():
+                row[field] += getattr(order, source)
+
+    items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.00')})
+    lines = (
+        OrderItem.objects
+        .filter(order__in=list(buckets))
+        .values('order_id', 'menu_item_id')
+        .annotate(sold=Sum('quantity'), line_revenue=Sum('line_total'))
+        .order_by()
+    )
+    for line in lines:
+        for period, start in buckets[line['order_id']].items():
+            row = items[(branches[line['order_id']], period, start, line['menu_item_id'])]
+            row['quantity'] += line['sold']
+            row['revenue'] += line['line_revenue']
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    count = PositiveIntegerField()
+    with transaction.atomic(using=router.db_for_write(SalesRollup)):
+        increment(
+            SalesRollup, sales, ['branch_id', 'period', 'period_start'],
+            {'covers': count, 'revenue': money, 'tax': money, 'service_charge': money, 'total': money},
+        )
+        increment(
+            MenuItemSalesRollup, items, ['branch_id', 'period', 'period_start', 'menu_item_id'],
+            {'quantity': count, 'revenue': money},
+        )
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.db import router, transaction
+
+from ..models import ArchivedOrder, Order, OrderItem
+
+ARCHIVABLE_STATUSES = ['closed', 'cancelled']
+ORDER_FIELDS = [
+    'id', 'branch_id', 'table_id', 'placed_by_id', 'status', 'subtotal', 'tax', 'service_charge', 'total',
+    'note', 'created_at', 'updated_at', 'completed_at',
+]
+ITEM_FIELDS = ['id', 'menu_item_id', 'menu_item__name', 'quantity', 'unit_price', 'line_total']
+
+
+def archive_orders(before, batch_size=1000):
+    """
+    Move closed and cancelled orders created before `before`, with their items, into
+    ArchivedOrder. Each batch of `batch_size` orders is copied and deleted in its own
+    transaction with a fixed number of queries, so the live tables are never locked
+    for long. Returns how many orders were archived.
+
+    Sales rollups already hold the archived sales, and rebuild_sales_rollups reads
+    them back from the archive.
+    """
+    archivable = Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=before)
+    archived = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(Order)):
+            ids = list(archivable.order_by('created_at', 'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return archived
+            archive_batch(ids)
+        archived += len(ids)
+
+
+def archive_batch(order_ids):
+    items = defaultdict(list)
+    lines = OrderItem.objects.filter(order_id__in=order_ids).values('order_id', *ITEM_FIELDS).order_by('created_at', 'id')
+    for line in lines:
+        items[line.pop('order_id')].append({
+            'id': line['id'],
+            'menu_item': line['menu_item_id'],
+            'menu_item_name': line['menu_item__name'],
+            'quantity': line['quantity'],
+            'unit_price': line['unit_price'],
+            'line_total': line['line_total'],
+        })
+
+    orders = Order.objects.filter(pk__in=order_ids).values(*ORDER_FIELDS)
+    ArchivedOrder.objects.bulk_create([ArchivedOrder(**order, items=items[order['id']]) for order in orders])
+    # Queryset deletes skip OrderItem.delete(), which would re-total the orders being removed
+    OrderItem.objects.filter(order_id__in=order_ids).delete()
+    Order.objects.filter(pk__in=order_ids).delete()
@@ -0,0 +1,95 @@
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from ..models import OrderItem
+
+ORDER_COLUMNS = [
+    'id', 'created_at', 'completed_at', 'status', 'table_id', 'placed_by_id',
+    'subtotal', 'tax', 'service_charge', 'total', 'note',
+]
+ITEM_COLUMNS = ['id', 'menu_item_id', 'menu_item__name', 'quantity', 'unit_price', 'line_total']
+CSV_HEADER = [f"order_{column}" for column in ORDER_COLUMNS] + [
+    'item_id', 'menu_item_id', 'menu_item_name', 'quantity', 'unit_price', 'line_total',
+]
+FORMATS = ['csv', 'ndjson']
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def order_chunks(orders, chunk_size):
+    """
+    Yield (order rows, {order_id: item rows}) per chunk. Orders are read through a
+    server-side cursor and each chunk's items are fetched with a single query, so
+    memory is bounded by `chunk_size` however large the export is. Items are read from
+    the same database as the orders.
+    """
+    chunk = []
+    for row in orders.values_list(*ORDER_COLUMNS).order_by('created_at', 'id').iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk, items_for(chunk, orders.db)
+            chunk = []
+    if chunk:
+        yield chunk, items_for(chunk, orders.db)
+
+
+def items_for(orders, using):
+    items = {row[0]: [] for row in orders}
+    lines = (
+        OrderItem.objects.using(using)
+        .filter(order_id__in=list(items))
+        .values_list('order_id', *ITEM_COLUMNS)
+        .order_by('created_at', 'id')
+    )
+    for order_id, *line in lines:
+        items[order_id].append(line)
+    return items
+
+
+class Echo:
+    """
+    File-like object that hands back what is written, for streaming csv.writer output.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(orders, chunk_size=2000):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for chunk, items in order_chunks(orders, chunk_size):
+        for order in chunk:
+            order_values = [plain(value) for value in order]
+            lines = items[order[0]] or [[None] * len(ITEM_COLUMNS)]
+            for line in lines:
+                yield writer.writerow(order_values + [plain(value) for value in line])
+
+
+def stream_ndjson(orders, chunk_size=2000):
+    item_keys = ['id', 'menu_item_id', 'menu_item_name', 'quantity', 'unit_price', 'line_total']
+    for chunk, items in order_chunks(orders, chunk_size):
+        for order in chunk:
+            record = {column: plain(value) for column, value in zip(ORDER_COLUMNS, order)}
+            record['items'] = [
+                {key: plain(value) for key, value in zip(item_keys, line)} for line in items[order[0]]
+            ]
+            yield json.dumps(record) + '\n'
+
+
+def stream_orders(orders, output_format, chunk_size=2000):
+    """
+    Stream `orders` and their items as CSV (one row per item) or NDJSON (one order per line).
+    """
+    if output_format == 'csv':
+        return stream_csv(orders, chunk_size)
+    return stream_ndjson(orders, chunk_size)
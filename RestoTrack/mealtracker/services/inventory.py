@@ -0,0 +1,70 @@
+from django.db import router, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.utils import timezone
+
+from ..alerts import queue_low_stock_alerts
+from ..models import Inventory
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when stock cannot cover a reservation. `shortfalls` lists every short item as
+    {'menu_item_id', 'requested', 'available'}; nothing is decremented in that case.
+    """
+    def __init__(self, shortfalls):
+        super().__init__(shortfalls)
+        self.shortfalls = shortfalls
+
+
+def reserve_stock(quantities):
+    """
+    Decrement stock for {menu_item_id: quantity} with one conditional UPDATE:
+
+        UPDATE ... SET quantity = quantity - n WHERE menu_item_id = m AND quantity >= n
+
+    for all items at once. No rows are read or locked beforehand, so concurrent orders
+    only contend for the duration of the UPDATE on the items they share. Either every
+    item is decremented or none is and InsufficientStock reports each shortfall.
+    """
+    if not quantities:
+        return
+
+    covered = Q()
+    for menu_item_id, qty in quantities.items():
+        covered |= Q(menu_item_id=menu_item_id, quantity__gte=qty)
+
+    with transaction.atomic(using=router.db_for_write(Inventory)):
+        updated = Inventory.objects.filter(covered).update(
+            quantity=Case(
+                *[When(menu_item_id=menu_item_id, then=F('quantity') - qty) for menu_item_id, qty in quantities.items()],
+                output_field=PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if updated != len(quantities):
+            # Undo the partial decrement before reading what is actually in stock
+            transaction.set_rollback(True)
+
+    if updated == len(quantities):
+        queue_low_stock_alerts(crossed_threshold(quantities))
+        return
+
+    available = dict(
+        Inventory.objects.filter(menu_item_id__in=quantities).values_list('menu_item_id', 'quantity')
+    )
+    raise InsufficientStock([
+        {'menu_item_id': menu_item_id, 'requested': qty, 'available': available.get(menu_item_id, 0)}
+        for menu_item_id, qty in quantities.items()
+        if available.get(menu_item_id, 0) < qty
+    ])
+
+
+def crossed_threshold(quantities):
+    """
+    Rows that the decrement in {menu_item_id: quantity} just took from above their
+    threshold to at or below it. Only rows that are low now are read.
+    """
+    rows = Inventory.low_stock().filter(menu_item_id__in=list(quantities)).values(
+        'id', 'menu_item_id', 'item_name', 'quantity', 'min_threshold',
+    )
+    return [row for row in rows if row['quantity'] + quantities[row['menu_item_id']] > row['min_threshold']]
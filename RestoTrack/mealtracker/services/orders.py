@@ -0,0 +1,143 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from ..cache import bump_floor_version
+from ..events import order_event
+from ..models import Order, OrderItem
+from ..outbox import record_events
+from ..pricing import price_book
+from .inventory import reserve_stock, InsufficientStock
+
+
+class OrderPlacementError(Exception):
+    """
+    Raised when an order cannot be placed. `errors` holds one message per failing line;
+    `shortfalls` carries the structured stock report when stock ran out.
+    """
+    def __init__(self, errors, shortfalls=None):
+        super().__init__(errors)
+        self.errors = errors
+        self.shortfalls = shortfalls or []
+
+
+def place_order(user, items, **order_fields):
+    """
+    Create an order with all of its lines in a fixed number of queries.
+
+    `items` is a list of {'menu_item_id': ..., 'quantity': ...} dicts. Lines are priced
+    and checked against the in-process price book (pricing.py) without reading the menu,
+    written with `bulk_create`, totals are computed once and stock is reserved with a
+    single conditional UPDATE, so the query count does not grow with the number of
+    lines. The 'order.created' feed event is recorded in the same transaction.
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['menu_item_id']] += item['quantity']
+
+    # A branch only sells its own menu
+    branch = order_fields.get('branch')
+    book = price_book()
+    if any(book.get(menu_item_id, branch) is None for menu_item_id in quantities):
+        # Possibly an item added since the book was read (e.g. in another process)
+        book = price_book(refresh=True)
+    menu_items = {menu_item_id: book.get(menu_item_id, branch) for menu_item_id in quantities}
+
+    errors = []
+    for menu_item_id, menu_item in menu_items.items():
+        if menu_item is None:
+            errors.append(f"Menu item {menu_item_id} does not exist")
+        elif not menu_item.available:
+            errors.append(f"{menu_item.name} is not available")
+    if errors:
+        raise OrderPlacementError(errors)
+
+    with transaction.atomic(using=router.db_for_write(Order)):
+        # --- Order and lines ---
+        # `user` may be a token-backed user, so link it by id
+        order = Order.objects.create(placed_by_id=user.pk if user.is_authenticated else None, **order_fields)
+        lines = []
+        for item in items:
+            menu_item = menu_items[item['menu_item_id']]
+            lines.append(OrderItem(
+                order=order,
+                menu_item_id=menu_item.menu_item_id,
+                quantity=item['quantity'],
+                unit_price=menu_item.price,
+                line_total=(menu_item.price * item['quantity']).quantize(Decimal('0.01')),
+            ))
+        OrderItem.objects.bulk_create(lines)
+
+        totals = Order.totals_for(sum((line.line_total for line in lines), Decimal('0.00')))
+        Order.objects.filter(pk=order.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(order, field, value)
+
+        # --- Inventory, last so the stock rows stay locked only until commit ---
+        try:
+            reserve_stock(quantities)
+        except InsufficientStock as exc:
+            raise OrderPlacementError(
+                [
+                    f"Not enough stock for {menu_items[short['menu_item_id']].name}. "
+                    f"Requested: {short['requested']}, available: {short['available']}"
+                    for short in exc.shortfalls
+                ],
+                shortfalls=exc.shortfalls,
+            )
+
+        record_events('order.created', [order_event('order.created', order)])
+
+    return order
+
+
+def transition_orders(order_ids, new_status):
+    """
+    Move many orders to `new_status` with one UPDATE that writes only status,
+    completed_at (when closing) and updated_at; totals are left alone.
+
+    Returns one result per requested id, in request order:
+    {'id', 'result': 'updated' | 'unchanged' | 'rejected' | 'not_found', 'previous_status'}.
+    Orders already in `new_status` are left as they are, so retrying a batch is harmless.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    sources = [source for source, targets in Order.TRANSITIONS.items() if new_status in targets]
+
+    with transaction.atomic(using=router.db_for_write(Order)):
+        orders = Order.objects.select_for_update().filter(pk__in=order_ids).only(
+            'id', 'status', 'table_id', 'subtotal', 'tax', 'service_charge', 'total', 'completed_at',
+        ).in_bulk()
+        movable = [order for order in orders.values() if order.status in sources]
+
+        now = timezone.now()
+        changes = {'status': new_status, 'updated_at': now}
+        if new_status == 'closed':
+            changes['completed_at'] = now
+        # Rows are locked above, so every movable order is still in its source status
+        Order.objects.filter(pk__in=[order.pk for order in movable]).update(**changes)
+        if movable:
+            transaction.on_commit(bump_floor_version, using=router.db_for_write(Order))
+
+        previous = {order.pk: order.status for order in movable}
+        for order in movable:
+            for field, value in changes.items():
+                setattr(order, field, value)
+        # Rollups and feed events for the whole batch go out in two outbox inserts
+        if new_status == 'closed':
+            record_events('order.closed', [{'order': str(order.pk)} for order in movable])
+        record_events('order.status', [order_event('order.status', order, previous[order.pk]) for order in movable])
+
+    results = []
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if order is None:
+            results.append({'id': order_id, 'result': 'not_found', 'previous_status': None})
+        elif order_id in previous:
+            results.append({'id': order_id, 'result': 'updated', 'previous_status': previous[order_id]})
+        elif order.status == new_status:
+            results.append({'id': order_id, 'result': 'unchanged', 'previous_status': order.status})
+        else:
+            results.append({'id': order_id, 'result': 'rejected', 'previous_status': order.status})
+    return results
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import BigIntegerField, Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+from ..models import Order, OrderItem
+
+TOTAL_FIELDS = ('subtotal', 'tax', 'service_charge', 'total')
+
+
+def cents(field):
+    """
+    A decimal column as whole cents, converted by the database so rows arrive as plain integers.
+    """
+    return Cast(Round(F(field) * Value(Decimal('100'))), BigIntegerField())
+
+
+def to_amount(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def round_half_even(numerator, denominator):
+    """
+    numerator / denominator rounded to an integer the way Decimal.quantize rounds by default.
+    """
+    sign = -1 if (numerator < 0) != (denominator < 0) else 1
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if 2 * remainder > abs(denominator) or (2 * remainder == abs(denominator) and quotient % 2):
+        quotient += 1
+    return sign * quotient
+
+
+def line_column(aggregate):
+    """
+    `aggregate` over an order's lines as a correlated subquery, so each chunk of orders
+    is still read straight off the (created_at, id) index.
+    """
+    lines = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .annotate(line_cents=cents('line_total'), unit_cents=cents('unit_price'))
+        .values('order')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(lines, output_field=BigIntegerField()), 0)
+
+
+def order_chunks(start, end, chunk_size):
+    """
+    Orders created in [start, end) as column tuples of `chunk_size` rows: id,
+    created_at, status, the stored totals in cents, and the order's lines summed in
+    cents, counted, and counted again where line_total is unit_price x quantity. Each
+    chunk is one query, read in (created_at, id) keyset order.
+    """
+    orders = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(
+            **{f'{field}_cents': cents(field) for field in TOTAL_FIELDS},
+            lines_cents=line_column(Sum('line_cents')),
+            lines=line_column(Count('id')),
+            matching_lines=line_column(Count('id', filter=Q(line_cents=F('unit_cents') * F('quantity')))),
+        )
+        .order_by('created_at', 'id')
+        .values_list(
+            'id', 'created_at', 'status', *(f'{field}_cents' for field in TOTAL_FIELDS),
+            'lines_cents', 'lines', 'matching_lines',
+        )
+    )
+    after = Q()
+    while True:
+        rows = list(orders.filter(after)[:chunk_size])
+        if not rows:
+            return
+        yield tuple(zip(*rows))
+        last_id, last_created_at = rows[-1][0], rows[-1][1]
+        after = Q(created_at__gt=last_created_at) | Q(created_at=last_created_at, id__gt=last_id)
+
+
+def reconcile_orders(start, end, chunk_size=5000):
+    """
+    Recompute the totals of every order created in [start, end) from its lines and
+    compare them with the stored ones. Each chunk of orders is read with one query
+    that returns the stored totals and the line sums in integer cents; tax and service
+    charge are recomputed over those columns with the rates from settings, rounded like
+    Order.totals_for. Lines whose line_total is not unit_price x quantity are looked up
+    only for the orders that have some.
+
+    Returns {'orders', 'lines', 'stored', 'expected', 'by_status', 'mismatches',
+    'line_mismatches'}: stored and expected are sums per total field, by_status holds
+    the order count and stored total per status, and each mismatch lists the fields
+    that disagree.
+    """
+    tax_rate, service_rate = (rate.as_integer_ratio() for rate in Order.rates())
+
+    orders = lines = 0
+    stored_sums = dict.fromkeys(TOTAL_FIELDS, 0)
+    expected_sums = dict.fromkeys(TOTAL_FIELDS, 0)
+    by_status = defaultdict(lambda: {'orders': 0, 'total': 0})
+    mismatches = []
+    line_mismatches = []
+
+    for chunk in order_chunks(start, end, chunk_size):
+        ids, _, statuses, *stored_cents, lines_cents, line_counts, matching_line_counts = chunk
+
+        # --- Expected totals per column. Orders are totalled from their stored lines,
+        # as Order.calculate_totals does ---
+        expected_tax = [round_half_even(subtotal * tax_rate[0], tax_rate[1]) for subtotal in lines_cents]
+        expected_service = [round_half_even(subtotal * service_rate[0], service_rate[1]) for subtotal in lines_cents]
+        expected_total = [sum(parts) for parts in zip(lines_cents, expected_tax, expected_service)]
+        expected_cents = [lines_cents, expected_tax, expected_service, expected_total]
+
+        orders += len(ids)
+        lines += sum(line_counts)
+        for field, stored, expected in zip(TOTAL_FIELDS, stored_cents, expected_cents):
+            stored_sums[field] += sum(stored)
+            expected_sums[field] += sum(expected)
+        for status, total in zip(statuses, stored_cents[3]):
+            by_status[status]['orders'] += 1
+            by_status[status]['total'] += total
+
+        for i, (stored_row, expected_row) in enumerate(zip(zip(*stored_cents), zip(*expected_cents))):
+            if stored_row != expected_row:
+                mismatches.append({
+                    'order': ids[i],
+                    'fields': {
+                        field: {'stored': to_amount(stored), 'expected': to_amount(expected)}
+                        for field, stored, expected in zip(TOTAL_FIELDS, stored_row, expected_row)
+                        if stored != expected
+                    },
+                })
+
+        # --- Lines that do not add up ---
+        with_bad_lines = [order_id for order_id, *counts in zip(ids, line_counts, matching_line_counts) if counts[0] != counts[1]]
+        if with_bad_lines:
+            bad_lines = (
+                OrderItem.objects.filter(order_id__in=with_bad_lines)
+                .annotate(line_cents=cents('line_total'), unit_cents=cents('unit_price'))
+                .exclude(line_cents=F('unit_cents') * F('quantity'))
+                .values_list('id', 'order_id', 'line_total', 'unit_cents', 'quantity')
+            )
+            for line_id, order_id, line_total, unit_cents, quantity in bad_lines:
+                line_mismatches.append({
+                    'line': line_id, 'order': order_id, 'stored': line_total, 'expected': to_amount(unit_cents * quantity),
+                })
+
+    return {
+        'orders': orders,
+        'lines': lines,
+        'stored': {field: to_amount(amount) for field, amount in stored_sums.items()},
+        'expected': {field: to_amount(amount) for field, amount in expected_sums.items()},
+        'by_status': {
+            status: {'orders': row['orders'], 'total': to_amount(row['total'])}
+            for status, row in sorted(by_status.items())
+        },
+        'mismatches': mismatches,
+        'line_mismatches': line_mismatches,
+    }
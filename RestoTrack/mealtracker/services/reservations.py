@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Exists, OuterRef
+
+from ..models import Table, Reservation, ReservationSlot
+
+
+class ReservationConflict(Exception):
+    """
+    Raised when a booking would overlap another reservation, does not fit the table or
+    the table is out of service.
+    """
+
+
+def slot_length():
+    return timedelta(minutes=getattr(settings, 'RESERVATION_SLOT_MINUTES', 30))
+
+
+def booking_length():
+    return timedelta(minutes=getattr(settings, 'RESERVATION_DURATION_MINUTES', 90))
+
+
+def slot_starts(start, end):
+    """
+    Every slot on the grid that the interval [start, end) touches.
+    """
+    step = int(slot_length().total_seconds())
+    first = int(start.timestamp()) // step * step
+    slots = []
+    moment = first
+    while moment < end.timestamp():
+        slots.append(datetime.fromtimestamp(moment, tz=dt_timezone.utc))
+        moment += step
+    return slots
+
+
+def check_capacity(table, party_size):
+    if not table.is_available:
+        raise ReservationConflict(f"Table {table.number} is not available.")
+    if party_size > table.capacity:
+        raise ReservationConflict(f"Table {table.number} seats at most {table.capacity} guests.")
+
+
+def book_table(table, reservation_time, party_size=1, **fields):
+    """
+    Create a reservation and claim its slots in one transaction. The unique
+    (table, slot_start) constraint rejects overlapping bookings atomically.
+    """
+    check_capacity(table, party_size)
+
+    end_time = reservation_time + booking_length()
+    try:
+        with transaction.atomic(using=router.db_for_write(Reservation)):
+            reservation = Reservation.objects.create(
+                branch_id=table.branch_id,
+                table=table,
+                reservation_time=reservation_time,
+                end_time=end_time,
+                party_size=party_size,
+                **fields,
+            )
+            claim_slots(reservation)
+    except IntegrityError:
+        raise ReservationConflict(f"Table {table.number} is already booked at that time.")
+    return reservation
+
+
+def claim_slots(reservation):
+    ReservationSlot.objects.bulk_create([
+        ReservationSlot(reservation=reservation, table_id=reservation.table_id, slot_start=slot)
+        for slot in slot_starts(reservation.reservation_time, reservation.end_time)
+    ])
+
+
+def sync_slots(reservation):
+    """
+    Re-claim a reservation's slots after its table, party size, time or status changed.
+    Released reservations (cancelled, completed, ...) hold no slots.
+    """
+    if reservation.status not in Reservation.RELEASED_STATUSES:
+        check_capacity(reservation.table, reservation.party_size)
+    reservation.end_time = reservation.reservation_time + booking_length()
+    reservation.branch_id = reservation.table.branch_id
+    try:
+        with transaction.atomic(using=router.db_for_write(Reservation, instance=reservation)):
+            reservation.save()
+            reservation.slots.all().delete()
+            if reservation.status not in Reservation.RELEASED_STATUSES:
+                claim_slots(reservation)
+    except IntegrityError:
+        raise ReservationConflict(f"Table {reservation.table} is already booked at that time.")
+    return reservation
+
+
+def free_tables(reservation_time, party_size, branch=None):
+    """
+    Tables in service that seat `party_size` and have none of the slots a booking at
+    `reservation_time` would need, in `branch` if given. Answered in one query from
+    the slot index.
+    """
+    slots = slot_starts(reservation_time, reservation_time + booking_length())
+    taken = ReservationSlot.objects.filter(table=OuterRef('pk'), slot_start__in=slots)
+    tables = Table.objects.filter(is_available=True, capacity__gte=party_size)
+    if branch is not None:
+        tables = tables.filter(branch=branch)
+    return tables.filter(~Exists(taken)).order_by('capacity', 'number')
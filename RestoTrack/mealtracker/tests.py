@@ -1,3 +1,1418 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import benchmarks, outbox
+from .alerts import get_notifiers
+from .authentication import ClaimsRefreshToken, revocations
+from .cache import menu_cache
+from .events import get_broker
+from .feed import ORDER_FEED_PATH, order_feed
+from .idempotency import (
+    CacheKeyStore, get_key_store, fingerprint_request, STARTED, REPLAY, IN_PROGRESS, MISMATCH,
+)
+from .admin import EstimatedCountPaginator
+from .middleware import QueryRecorder, slow_requests
+from .models import (
+    ArchivedOrder, Branch, MenuItem, Table, Inventory, Order, OrderItem, Reservation, SalesRollup, MenuItemSalesRollup,
+    IdempotencyKey, OutboxEvent,
+)
+from .outbox import drain, handles, purge_processed, record_events
+from .pricing import clear_price_books, price_book
+from .routers import BranchRouter, ReadReplicaRouter, branch_alias, branch_database, replica_reads
+from .serializers import MenuItemSerializer, TableSerializer, InventorySerializer, OrderSerializer
+from .services.inventory import reserve_stock
+from .services.orders import place_order, OrderPlacementError
+from .services.reconciliation import reconcile_orders, round_half_even
+from .services.reservations import book_table, ReservationConflict
+
+User = get_user_model()
+
+
+class OrderPlacementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', password='secret-pass')
+        cls.table = Table.objects.create(number=1, capacity=4)
+        cls.menu = [
+            MenuItem.objects.create(name=f"Dish {i}", price=Decimal('1000.00') + i)
+            for i in range(20)
+        ]
+        Inventory.objects.bulk_create([
+            Inventory(menu_item=item, item_name=item.name, quantity=100) for item in cls.menu
+        ])
+
+    def setUp(self):
+        clear_price_books()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def place(self, lines):
+        payload = {
+            'table': self.table.pk,
+            'items': [{'menu_item_id': item.pk, 'quantity': 2} for item in self.menu[:lines]],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(ctx.captured_queries)
+
+    def test_order_totals_and_stock(self):
+        response, _ = self.place(3)
+        order = Order.objects.get(pk=response.data['id'])
+
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.subtotal, Decimal('6006.00'))
+        self.assertEqual(order.total, Order.totals_for(Decimal('6006.00'))['total'])
+        self.assertEqual(Inventory.objects.get(item_name='Dish 0').quantity, 98)
+        self.assertEqual(Inventory.objects.get(item_name='Dish 5').quantity, 100)
+
+    def test_query_count_is_constant(self):
+        price_book()  # loaded once per menu version, not per order
+        _, single_line = self.place(1)
+        _, fifteen_lines = self.place(15)
+        self.assertEqual(single_line, fifteen_lines)
+
+    def test_insufficient_stock_rolls_back(self):
+        Inventory.objects.filter(item_name='Dish 1').update(quantity=1)
+        response = self.client.post('/api/orders/', {
+            'items': [
+                {'menu_item_id': self.menu[0].pk, 'quantity': 2},
+                {'menu_item_id': self.menu[1].pk, 'quantity': 2},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['shortfalls'], [
+            {'menu_item_id': self.menu[1].pk, 'requested': 2, 'available': 1},
+        ])
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderItem.objects.count(), 0)
+        self.assertEqual(Inventory.objects.get(item_name='Dish 0').quantity, 100)
+
+
+class IncrementalTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dish = MenuItem.objects.create(name="Jollof", price=Decimal('12.50'))
+
+    def setUp(self):
+        # Menu rows are never committed here, so the price book would not see them change
+        clear_price_books()
+
+    def test_item_writes_apply_deltas(self):
+        order = Order.objects.create()
+        first = OrderItem.objects.create(order=order, menu_item=self.dish, quantity=2)
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=1)
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal('37.50'))
+
+        first.quantity = 4
+        first.save()
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal('62.50'))
+
+        OrderItem.objects.get(pk=first.pk).delete()
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal('12.50'))
+        self.assertEqual(order.total, Order.totals_for(Decimal('12.50'))['total'])
+
+    def test_adding_an_item_does_not_scale_with_order_size(self):
+        order = Order.objects.create()
+        price_book()
+        counts = []
+        for _ in range(5):
+            with CaptureQueriesContext(connection) as ctx:
+                OrderItem.objects.create(order=order, menu_item=self.dish, quantity=1)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_check_order_totals_command(self):
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=2)
+        Order.objects.filter(pk=order.pk).update(subtotal=Decimal('1.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('check_order_totals', stdout=StringIO())
+        call_command('check_order_totals', '--rebuild', stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal('25.00'))
+        call_command('check_order_totals', stdout=StringIO())
+
+
+class OrderListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='secret-pass', is_staff=True)
+        cls.table = Table.objects.create(number=7, capacity=2)
+        cls.dishes = [MenuItem.objects.create(name=f"Dish {i}", price=Decimal('5.00')) for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(table=self.table)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=dish, quantity=1, unit_price=dish.price, line_total=dish.price)
+                for dish in self.dishes
+            ])
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        self.create_orders(2)
+        _, few = self.list_queries()
+        self.create_orders(10)
+        response, many = self.list_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+    def test_list_is_cursor_paginated(self):
+        self.create_orders(5)
+        response = self.client.get('/api/orders/', {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        seen = {row['id'] for row in response.data['results']}
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(seen & {row['id'] for row in response.data['results']})
+
+    def test_list_filters(self):
+        self.create_orders(3)
+        other_table = Table.objects.create(number=8, capacity=4)
+        Order.objects.create(table=other_table, status='preparing')
+
+        response = self.client.get('/api/orders/', {'status': 'preparing'})
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/orders/', {'table': self.table.pk, 'status': 'pending,preparing'})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get('/api/orders/', {'created_after': '2999-01-01'})
+        self.assertEqual(len(response.data['results']), 0)
+
+        self.assertEqual(self.client.get('/api/orders/', {'status': 'eaten'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/', {'created_before': 'soon'}).status_code, 400)
+
+
+class MenuCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rice = MenuItem.objects.create(name="Fried rice", price=Decimal('8.00'))
+        cls.soup = MenuItem.objects.create(name="Egusi", price=Decimal('9.00'), available=False)
+
+    def setUp(self):
+        menu_cache().clear()
+        self.client = APIClient()
+
+    def test_list_is_cached_until_menu_changes(self):
+        first = self.client.get('/api/menu/')
+        self.assertEqual(len(first.data), 2)
+        with self.assertNumQueries(0):
+            self.client.get('/api/menu/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(name="Suya", price=Decimal('4.00'))
+        response = self.client.get('/api/menu/')
+        self.assertEqual(len(response.data), 3)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_available_variant(self):
+        response = self.client.get('/api/menu/', {'available': 'true'})
+        self.assertEqual([row['name'] for row in response.data], ["Fried rice"])
+
+    def test_conditional_get(self):
+        response = self.client.get('/api/menu/')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        detail = self.client.get(f'/api/menu/{self.rice.pk}/')
+        self.assertEqual(
+            self.client.get(f'/api/menu/{self.rice.pk}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304,
+        )
+
+    def test_sparse_lists_have_their_own_etag(self):
+        full = self.client.get('/api/menu/')
+        sparse = self.client.get('/api/menu/', {'fields': 'name'})
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+        self.assertEqual(self.client.get('/api/menu/', {'fields': 'name'}, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/menu/', {'fields': 'name'}, HTTP_IF_NONE_MATCH=sparse['ETag']).status_code, 304)
+
+    def test_deleting_an_item_moves_last_modified(self):
+        response = self.client.get('/api/menu/')
+        self.assertEqual(
+            self.client.get('/api/menu/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304,
+        )
+        later = timezone.now() + timedelta(seconds=5)
+        with mock.patch('mealtracker.cache.timezone.now', return_value=later), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.rice.delete()
+        response = self.client.get('/api/menu/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class ReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', password='secret-pass')
+        cls.small = Table.objects.create(number=1, capacity=2)
+        cls.large = Table.objects.create(number=2, capacity=6)
+        cls.at = timezone.now().replace(hour=19, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, table, at, party_size=2):
+        return self.client.post('/api/reservations/', {
+            'table': table.pk,
+            'customer_name': "Ada",
+            'customer_phone': "0800",
+            'party_size': party_size,
+            'reservation_time': at.isoformat(),
+        }, format='json')
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book(self.small, self.at).status_code, 201)
+        self.assertEqual(self.book(self.small, self.at + timedelta(minutes=45)).status_code, 409)
+        self.assertEqual(self.book(self.small, self.at + timedelta(minutes=90)).status_code, 201)
+        self.assertEqual(self.book(self.small, self.at, party_size=4).status_code, 409)
+
+    def test_availability(self):
+        self.book(self.large, self.at, party_size=4)
+        response = self.client.get('/api/reservations/availability/', {
+            'time': self.at.isoformat(), 'party_size': 2,
+        })
+        self.assertEqual([row['number'] for row in response.data], [1])
+        response = self.client.get('/api/reservations/availability/', {
+            'time': (self.at + timedelta(hours=3)).isoformat(), 'party_size': 5,
+        })
+        self.assertEqual([row['number'] for row in response.data], [2])
+
+    def test_moving_a_booking_checks_capacity(self):
+        reservation = self.book(self.large, self.at, party_size=4).data
+        self.client.force_authenticate(User.objects.create_user('host', password='secret-pass', is_staff=True))
+        url = f"/api/reservations/{reservation['id']}/"
+        self.assertEqual(self.client.patch(url, {'table': self.small.pk}, format='json').status_code, 409)
+        self.assertEqual(self.client.patch(url, {'party_size': 8}, format='json').status_code, 409)
+        self.assertEqual(
+            Reservation.objects.filter(pk=reservation['id']).values_list('table', 'party_size').get(), (self.large.pk, 4),
+        )
+        self.assertEqual(self.client.patch(url, {'party_size': 6}, format='json').status_code, 200)
+
+
+    def test_tables_out_of_service_cannot_be_booked(self):
+        reservation = self.book(self.large, self.at).data
+        Table.objects.filter(pk=self.small.pk).update(is_available=False)
+        self.assertEqual(self.book(self.small, self.at).status_code, 409)
+        self.client.force_authenticate(User.objects.create_user('host', password='secret-pass', is_staff=True))
+        response = self.client.patch(f"/api/reservations/{reservation['id']}/", {'table': self.small.pk}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_availability_skips_tables_out_of_service(self):
+        Table.objects.filter(pk=self.small.pk).update(is_available=False)
+        response = self.client.get('/api/reservations/availability/', {
+            'time': self.at.isoformat(), 'party_size': 2,
+        })
+        self.assertEqual([row['number'] for row in response.data], [2])
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_concurrent_bookings_of_one_slot(self):
+        table = Table.objects.create(number=1, capacity=4)
+        at = timezone.now() + timedelta(days=1)
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def attempt(i):
+            try:
+                barrier.wait()
+                book_table(table, at + timedelta(minutes=i), customer_name=f"Guest {i}", customer_phone="0800")
+                outcomes.append('booked')
+            except ReservationConflict:
+                outcomes.append('conflict')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('booked'), 1)
+        self.assertEqual(outcomes.count('conflict'), 7)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('manager', password='secret-pass', is_staff=True)
+        cls.dish = MenuItem.objects.create(name="Pepper soup", price=Decimal('10.00'))
+
+    def setUp(self):
+        clear_price_books()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def close_order(self, quantity):
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=quantity)
+        response = self.client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'closed'})
+        self.assertEqual(response.status_code, 200)
+        drain()
+        return order
+
+    def test_closing_orders_updates_rollups(self):
+        self.close_order(2)
+        self.close_order(3)
+        # Closing twice must not count the order again
+        order = self.close_order(1)
+        self.client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'closed'})
+        drain()
+
+        day = SalesRollup.objects.get(period='day')
+        self.assertEqual(day.covers, 3)
+        self.assertEqual(day.revenue, Decimal('60.00'))
+        self.assertEqual(day.total, sum(
+            Order.totals_for(Decimal(subtotal))['total'] for subtotal in ['20.00', '30.00', '10.00']
+        ))
+        item = MenuItemSalesRollup.objects.get(period='hour')
+        self.assertEqual((item.quantity, item.revenue), (6, Decimal('60.00')))
+
+        response = self.client.get('/api/analytics/sales/', {'period': 'hour'})
+        self.assertEqual(response.data[0]['covers'], 3)
+
+    def test_closed_orders_cannot_be_reopened_by_patch(self):
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=1)
+        response = self.client.patch(f'/api/orders/{order.pk}/', {'status': 'closed', 'note': 'paid'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(f'/api/orders/{order.pk}/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        drain()
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.note), ('closed', 'paid'))
+        self.assertIsNotNone(order.completed_at)
+        day = SalesRollup.objects.get(period='day')
+        self.assertEqual((day.covers, day.revenue), (1, Decimal('10.00')))
+
+    def test_new_orders_start_pending(self):
+        Inventory.objects.create(menu_item=self.dish, item_name=self.dish.name, quantity=5)
+        response = self.client.post('/api/orders/', {
+            'status': 'closed', 'items': [{'menu_item_id': self.dish.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().status, 'pending')
+
+    def test_rebuild_matches_incremental(self):
+        self.close_order(2)
+        self.close_order(4)
+        expected = list(SalesRollup.objects.values_list('period', 'covers', 'revenue', 'total'))
+
+        SalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(list(SalesRollup.objects.values_list('period', 'covers', 'revenue', 'total')), expected)
+        self.assertEqual(MenuItemSalesRollup.objects.get(period='day').quantity, 6)
+
+
+class LeanListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('lean', password='secret-pass', is_staff=True)
+        cls.table = Table.objects.create(number=3, capacity=2)
+        cls.dishes = [MenuItem.objects.create(name=f"Dish {i}", price=Decimal('2.50') * (i + 1)) for i in range(3)]
+        Inventory.objects.create(menu_item=cls.dishes[0], item_name="Dish 0", quantity=4)
+        for table in [cls.table, None]:
+            order = Order.objects.create(table=table, placed_by=cls.staff, note="no pepper")
+            OrderItem.objects.create(order=order, menu_item=cls.dishes[0], quantity=2)
+
+    def setUp(self):
+        menu_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def assertMatchesSerializer(self, path, serializer_class, queryset):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        rows = rows['results'] if isinstance(rows, dict) else rows
+        expected = json.loads(JSONRenderer().render(serializer_class(queryset, many=True).data))
+        self.assertEqual(rows, expected)
+
+    def test_lists_match_the_model_serializers(self):
+        self.assertMatchesSerializer('/api/menu/', MenuItemSerializer, MenuItem.objects.order_by('id'))
+        self.assertMatchesSerializer('/api/tables/', TableSerializer, Table.objects.all())
+        self.assertMatchesSerializer('/api/inventory/', InventorySerializer, Inventory.objects.all())
+        self.assertMatchesSerializer('/api/orders/', OrderSerializer, Order.objects.order_by('-created_at', '-id'))
+
+    def test_sparse_fieldsets(self):
+        response = self.client.get('/api/menu/', {'fields': 'id,price'})
+        self.assertEqual(response.json()[0], {'id': self.dishes[0].pk, 'price': '2.50'})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/', {'fields': 'id,total'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'total'})
+
+        response = self.client.get('/api/tables/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotentOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('kiosk', password='secret-pass')
+        cls.dish = MenuItem.objects.create(name="Puff puff", price=Decimal('3.00'))
+        cls.stock = Inventory.objects.create(menu_item=cls.dish, item_name=cls.dish.name, quantity=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'items': [{'menu_item_id': self.dish.pk, 'quantity': 2}]}
+
+    def post(self, key, payload=None):
+        return self.client.post('/api/orders/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post('abc-1')
+        self.assertEqual(first.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.post('abc-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        touched = [q['sql'] for q in ctx.captured_queries if 'mealtracker_order' in q['sql'] or 'inventory' in q['sql']]
+        self.assertEqual(touched, [])
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 8)
+
+    def test_key_reuse_and_concurrent_duplicates(self):
+        self.post('abc-2')
+        other = {'items': [{'menu_item_id': self.dish.pk, 'quantity': 1}]}
+        self.assertEqual(self.post('abc-2', other).status_code, 422)
+
+        # A duplicate that arrives while the first request holds the key
+        scope = f"POST /api/orders/ user:{self.user.pk}"
+        get_key_store().begin(scope, 'abc-3', fingerprint_request(SimpleNamespace(data=self.payload)))
+        self.assertEqual(self.post('abc-3').status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_requests_release_the_key(self):
+        self.assertEqual(self.post('abc-4', {'items': []}).status_code, 400)
+        self.assertEqual(self.post('abc-4').status_code, 201)
+
+    def test_expired_keys_are_pruned(self):
+        self.post('abc-5')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('abc-5').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_cache_key_store(self):
+        store = CacheKeyStore()
+        self.assertEqual(store.begin('scope', 'k', 'f1'), (STARTED, None))
+        self.assertEqual(store.begin('scope', 'k', 'f1'), (IN_PROGRESS, None))
+        store.complete('scope', 'k', 201, {'id': 1})
+        self.assertEqual(store.begin('scope', 'k', 'f1'), (REPLAY, {'status': 201, 'body': {'id': 1}}))
+        self.assertEqual(store.begin('scope', 'k', 'f2'), (MISMATCH, None))
+
+
+class LowStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('stock', password='secret-pass', is_staff=True)
+        cls.dishes = [MenuItem.objects.create(name=f"Dish {i}", price=Decimal('4.00')) for i in range(3)]
+        cls.stock = [
+            Inventory.objects.create(menu_item=dish, item_name=dish.name, quantity=quantity, min_threshold=5)
+            for dish, quantity in zip(cls.dishes, [7, 3, 50])
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.alerts = []
+        get_notifiers().append(self.alerts.append)
+        self.addCleanup(get_notifiers().remove, self.alerts.append)
+
+    def test_low_endpoint_lists_rows_at_or_below_threshold(self):
+        response = self.client.get('/api/inventory/low/', {'fields': 'item_name,quantity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'item_name': 'Dish 1', 'quantity': 3}])
+
+        with connection.cursor() as cursor:
+            sql, params = Inventory.low_stock().order_by('item_name', 'id').query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            self.assertIn('inventory_low_stock_idx', str(cursor.fetchall()))
+
+    def test_crossing_the_threshold_queues_one_alert(self):
+        reserve_stock({self.dishes[0].pk: 2, self.dishes[1].pk: 1, self.dishes[2].pk: 1})
+        self.assertEqual(self.alerts, [])
+        with self.assertLogs('mealtracker.alerts', 'WARNING'):
+            drain()
+        # Dish 0 went 7 -> 5; Dish 1 was already low and Dish 2 is nowhere near
+        self.assertEqual([(alert['item_name'], alert['quantity']) for alert in self.alerts], [('Dish 0', 5)])
+
+        reserve_stock({self.dishes[0].pk: 1})
+        drain()
+        self.assertEqual(len(self.alerts), 1)
+
+
+class OrderStatusBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('expo', password='secret-pass', is_staff=True)
+        cls.dish = MenuItem.objects.create(name="Suya", price=Decimal('8.00'))
+
+    def setUp(self):
+        clear_price_books()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def order(self, status, quantity=1):
+        order = Order.objects.create(status=status)
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=quantity)
+        return order
+
+    def test_batch_applies_allowed_transitions_in_one_update(self):
+        served = [self.order('served', quantity) for quantity in [1, 2, 3]]
+        cancelled, closed = self.order('cancelled'), self.order('closed')
+        missing = '00000000-0000-0000-0000-000000000000'
+        ids = [str(order.pk) for order in [*served, cancelled, closed]] + [missing]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/bulk-status/', {'ids': ids, 'status': 'closed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "mealtracker_order"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"total"', updates[0])
+
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            [result['result'] for result in response.data['results']],
+            ['updated', 'updated', 'updated', 'rejected', 'unchanged', 'not_found'],
+        )
+        for order in served:
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'closed')
+            self.assertIsNotNone(order.completed_at)
+        drain()
+        self.assertEqual(SalesRollup.objects.get(period='day').revenue, Decimal('48.00'))
+
+    def test_single_update_rejects_invalid_transition(self):
+        order = self.order('cancelled')
+        response = self.client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'preparing'})
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+
+    def test_batch_requires_staff(self):
+        self.client.force_authenticate(User.objects.create_user('guest', password='secret-pass'))
+        response = self.client.post('/api/orders/bulk-status/', {'ids': [], 'status': 'served'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('runner', password='secret-pass', is_staff=True)
+        cls.dish = MenuItem.objects.create(name="Jollof", price=Decimal('6.00'))
+
+    def test_side_effects_wait_for_commit_and_run_in_batches(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        orders = [Order.objects.create(status='served') for _ in range(3)]
+        for order in orders:
+            OrderItem.objects.create(order=order, menu_item=self.dish, quantity=1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            client.post('/api/orders/bulk-status/', {'ids': [str(o.pk) for o in orders], 'status': 'closed'}, format='json')
+        self.assertTrue(callbacks)
+        self.assertFalse(SalesRollup.objects.exists())
+        self.assertEqual(OutboxEvent.objects.filter(status='pending').count(), 6)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(drain(), 6)
+        # One claim per batch and one rollup upsert pass for all three orders
+        rollup_writes = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "mealtracker_salesrollup"')]
+        self.assertEqual(len(rollup_writes), 1)
+        self.assertEqual(SalesRollup.objects.get(period='day').covers, 3)
+        self.assertFalse(OutboxEvent.objects.exclude(status='done').exists())
+
+    def test_failures_back_off_and_give_up(self):
+        calls = []
+
+        @handles('test.flaky')
+        def flaky(events):
+            calls.append(len(events))
+            raise RuntimeError("downstream unavailable")
+        self.addCleanup(outbox._handlers.pop, 'test.flaky')
+
+        record_events('test.flaky', [{'n': 1}, {'n': 2}])
+        record_events('order.closed', [{'order': '00000000-0000-0000-0000-000000000000'}])
+        with self.assertLogs('mealtracker.outbox', 'ERROR'):
+            drain()
+        self.assertEqual(calls, [2])
+        event = OutboxEvent.objects.filter(topic='test.flaky').first()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.available_at, timezone.now())
+        # Other topics are not held back by the failing one
+        self.assertEqual(OutboxEvent.objects.get(topic='order.closed').status, 'done')
+
+        with override_settings(SIDE_EFFECTS={'MAX_ATTEMPTS': 2}), self.assertLogs('mealtracker.outbox', 'ERROR'):
+            OutboxEvent.objects.filter(topic='test.flaky').update(available_at=timezone.now())
+            drain()
+        self.assertEqual(set(OutboxEvent.objects.filter(topic='test.flaky').values_list('status', flat=True)), {'failed'})
+
+    def test_reclaimed_batch_is_rolled_back(self):
+        @handles('test.slow')
+        def slow(events):
+            Branch.objects.create(code='slow', name="Slow")
+            # The lease runs out mid-batch and another worker claims the events
+            OutboxEvent.objects.filter(topic='test.slow').update(claim=uuid.uuid4())
+        self.addCleanup(outbox._handlers.pop, 'test.slow')
+
+        record_events('test.slow', [{'n': 1}, {'n': 2}])
+        with self.assertLogs('mealtracker.outbox', 'WARNING'):
+            drain()
+        self.assertFalse(Branch.objects.filter(code='slow').exists())
+        self.assertEqual(set(OutboxEvent.objects.values_list('status', 'attempts')), {('pending', 0)})
+
+    def test_failure_leaves_reclaimed_events_alone(self):
+        record_events('test.slow', [{'n': 1}])
+        events = outbox.claim_batch(10, timedelta(seconds=60))
+        OutboxEvent.objects.update(claim=uuid.uuid4())
+        outbox.fail(events, "timed out", max_attempts=5)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.attempts, event.last_error), (0, ''))
+
+    def test_command_drains_and_purges(self):
+        record_events('order.closed', [{'order': '00000000-0000-0000-0000-000000000000'}])
+        out = StringIO()
+        call_command('process_outbox', stdout=out)
+        self.assertIn('Processed 1 events', out.getvalue())
+
+        OutboxEvent.objects.update(processed_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(purge_processed(), 1)
+
+
+class OrderArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('archivist', password='secret-pass', is_staff=True)
+        cls.table = Table.objects.create(number=12, capacity=4)
+        cls.dish = MenuItem.objects.create(name="Egusi", price=Decimal('9.00'))
+        old = timezone.now() - timedelta(days=120)
+        cls.orders = {}
+        for name, status, created_at in [
+            ('old_closed', 'closed', old), ('old_cancelled', 'cancelled', old),
+            ('old_open', 'pending', old), ('recent_closed', 'closed', timezone.now()),
+        ]:
+            order = Order.objects.create(table=cls.table, status=status, placed_by=cls.staff)
+            OrderItem.objects.create(order=order, menu_item=cls.dish, quantity=2)
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            cls.orders[name] = order
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_rollup_rebuild_keeps_archived_sales(self):
+        def rollups():
+            return (
+                sorted(SalesRollup.objects.values_list('period', 'period_start', 'covers', 'revenue', 'total')),
+                sorted(MenuItemSalesRollup.objects.values_list('period', 'period_start', 'menu_item', 'quantity', 'revenue')),
+            )
+
+        Order.objects.filter(pk=self.orders['old_closed'].pk).update(completed_at=timezone.now() - timedelta(days=120))
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        before = rollups()
+        self.assertEqual(len(before[0]), 4)  # hour and day rows for each closed order's period
+        call_command('archive_orders', '--days', '90', stdout=StringIO())
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(rollups(), before)
+
+    def test_command_moves_old_finished_orders_with_their_items(self):
+        out = StringIO()
+        call_command('archive_orders', '--days', '90', '--batch-size', '1', stdout=out)
+        self.assertIn('Archived 2 orders', out.getvalue())
+
+        archived_ids = {self.orders['old_closed'].pk, self.orders['old_cancelled'].pk}
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), archived_ids)
+        self.assertFalse(Order.objects.filter(pk__in=archived_ids).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived_ids).exists())
+        self.assertEqual(Order.objects.count(), 2)
+
+        archived = ArchivedOrder.objects.get(pk=self.orders['old_closed'].pk)
+        self.assertEqual((archived.total, archived.table_id, archived.placed_by_id), (self.orders['old_closed'].total, self.table.pk, self.staff.pk))
+        self.assertEqual([(item['menu_item_name'], item['quantity']) for item in archived.items], [("Egusi", 2)])
+
+    def test_archived_orders_are_still_served(self):
+        call_command('archive_orders', stdout=StringIO())
+
+        response = self.client.get('/api/orders/archive/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200)
+        [order] = response.json()['results']
+        self.assertEqual(order['id'], str(self.orders['old_cancelled'].pk))
+        self.assertEqual(order['items'][0]['line_total'], '18.00')
+
+        # The live detail URL falls back to the archive
+        response = self.client.get(f"/api/orders/{self.orders['old_closed'].pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['table']), ('closed', self.table.pk))
+        self.assertEqual(self.client.get('/api/orders/not-a-uuid/').status_code, 404)
+
+        self.client.force_authenticate(User.objects.create_user('diner', password='secret-pass'))
+        self.assertEqual(self.client.get('/api/orders/archive/').status_code, 403)
+
+
+class FloorPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('host', password='secret-pass', is_staff=True)
+        cls.tables = [Table.objects.create(number=number, capacity=4) for number in range(1, 6)]
+        cls.order = Order.objects.create(table=cls.tables[0], status='preparing')
+        Order.objects.create(table=cls.tables[1], status='closed')
+        now = timezone.now()
+        for table, starts_in in [(cls.tables[1], 10), (cls.tables[2], 180)]:
+            Reservation.objects.create(
+                table=table, customer_name="Ada", customer_phone="0800", party_size=2,
+                reservation_time=now + timedelta(minutes=starts_in), end_time=now + timedelta(minutes=starts_in + 90),
+            )
+        Table.objects.filter(pk=cls.tables[3].pk).update(is_available=False)
+
+    def setUp(self):
+        menu_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def states(self):
+        return {row['number']: row['state'] for row in self.client.get('/api/floor/').data['tables']}
+
+    def test_states_come_from_orders_and_reservations(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/floor/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {row['number']: row['state'] for row in response.data['tables']},
+            {1: 'seated', 2: 'reserved', 3: 'free', 4: 'unavailable', 5: 'free'},
+        )
+        seated = response.data['tables'][0]
+        self.assertEqual((seated['open_order'], seated['order_status']), (self.order.pk, 'preparing'))
+
+        # Polling is served from cache, and answered with 304 while nothing changed
+        with self.assertNumQueries(0):
+            repeat = self.client.get('/api/floor/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_rebuilt_plan_keeps_its_etag_while_nothing_changed(self):
+        response = self.client.get('/api/floor/')
+        # As if FLOOR_CACHE_TIMEOUT had passed
+        menu_cache().clear()
+        self.assertEqual(self.client.get('/api/floor/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(table=self.tables[4])
+        self.assertEqual(self.client.get('/api/floor/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_changes_invalidate_the_cached_plan(self):
+        self.assertEqual(self.states()[1], 'seated')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/orders/{self.order.pk}/update_status/', {'status': 'closed'})
+        self.assertEqual(self.states()[1], 'free')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(table=self.tables[4])
+        self.assertEqual(self.states()[5], 'seated')
+
+    def test_floor_requires_staff(self):
+        self.client.force_authenticate(User.objects.create_user('walk-in', password='secret-pass'))
+        self.assertEqual(self.client.get('/api/floor/').status_code, 403)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('accounts', password='secret-pass', is_staff=True)
+        dish = MenuItem.objects.create(name="Moi moi", price=Decimal('3.50'))
+        for quantity in [1, 2, 3]:
+            order = Order.objects.create()
+            OrderItem.objects.create(order=order, menu_item=dish, quantity=quantity)
+            OrderItem.objects.create(order=order, menu_item=dish, quantity=1)
+        Order.objects.create(note="no items")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_csv_export_streams_one_row_per_item(self):
+        response = self.client.get('/api/orders/export/')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], 'order_id')
+        self.assertEqual(len(rows), 1 + 3 * 2 + 1)
+
+    def test_ndjson_export_and_command(self):
+        response = self.client.get('/api/orders/export/', {'output': 'ndjson'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(sum(len(record['items']) for record in records), 6)
+
+        out = StringIO()
+        call_command('export_orders', '--format', 'ndjson', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertEqual(self.client.get('/api/orders/export/', {'output': 'xml'}).status_code, 400)
+
+
+class OrderFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('kitchen', password='secret-pass', is_staff=True)
+        cls.customer = User.objects.create_user('diner', password='secret-pass')
+
+    def run_feed(self, user, query=b'', events=()):
+        sent = []
+        token = str(AccessToken.for_user(user))
+
+        async def scenario():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            feed = asyncio.ensure_future(order_feed({
+                'type': 'http',
+                'path': ORDER_FEED_PATH,
+                'query_string': query + b'&token=' + token.encode(),
+                'headers': [],
+            }, receive, send))
+            while not sent and not feed.done():
+                await asyncio.sleep(0.01)
+            for event in events:
+                get_broker().publish(event)
+            await asyncio.sleep(0.05)
+            disconnect.set()
+            await asyncio.wait_for(feed, 1)
+
+        async_to_sync(scenario)()
+        return sent
+
+    def test_feed_streams_matching_events(self):
+        sent = self.run_feed(self.staff, b'status=pending', events=[
+            {'type': 'order.created', 'status': 'pending', 'order': '1'},
+            {'type': 'order.status', 'status': 'served', 'order': '2'},
+        ])
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        self.assertIn('event: order.created', body)
+        self.assertNotIn('order.status', body)
+
+    def test_feed_requires_staff(self):
+        sent = self.run_feed(self.customer)
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_status_change_publishes_event(self):
+        loop = asyncio.new_event_loop()
+        subscription = get_broker().subscribe(loop=loop)
+        try:
+            order = Order.objects.create()
+            client = APIClient()
+            client.force_authenticate(self.staff)
+            client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'preparing'})
+            drain()
+            event = loop.run_until_complete(asyncio.wait_for(subscription.queue.get(), 1))
+        finally:
+            get_broker().unsubscribe(subscription)
+            loop.close()
+        self.assertEqual((event['type'], event['status'], event['previous_status']), ('order.status', 'preparing', 'pending'))
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_scenario_runs_and_compares(self):
+        results = benchmarks.run(repeat=2, menu_items=60, tables=5, orders=20, items_per_order=3)
+        self.assertTrue({'orders-create', 'orders-bulk-status', 'orders-archive-detail', 'inventory-low'} <= set(results))
+        self.assertEqual(set(results['orders-list']), {'queries', 'p50_ms', 'p95_ms', 'peak_kb', 'rps'})
+        self.assertEqual(benchmarks.compare(results, results, threshold=0, slack={}), [])
+
+        regressed = {name: dict(row, queries=row['queries'] + 1) for name, row in results.items()}
+        self.assertEqual(len(benchmarks.compare(regressed, results, threshold=0, slack={})), len(results))
+
+    def test_serializer_comparison(self):
+        benchmarks.seed(menu_items=10, tables=3, orders=5, items_per_order=2)
+        for name, serialize, read in benchmarks.serializer_cases():
+            if '?fields' not in name:
+                self.assertEqual(
+                    json.loads(JSONRenderer().render(serialize())), json.loads(JSONRenderer().render(read())), name,
+                )
+        self.assertIn('speedup', benchmarks.compare_serializers(repeat=1)['orders page'])
+
+
+@override_settings(REQUEST_PROFILING={'ENABLED': True, 'DUPLICATE_THRESHOLD': 3})
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('root', password='secret-pass', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        slow_requests.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_requests_are_profiled(self):
+        Order.objects.create()
+        response = self.client.get('/api/orders/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        profiles = self.client.get('/api/profiling/slow-requests/').data
+        listing = next(profile for profile in profiles if profile['path'] == '/api/orders/')
+        self.assertEqual(listing['view'], 'OrderViewSet.list')
+        self.assertGreater(listing['queries'], 0)
+
+    def test_staff_can_read_but_not_clear_the_log(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='secret-pass', is_staff=True))
+        self.assertEqual(self.client.get('/api/profiling/slow-requests/').status_code, 200)
+        self.assertEqual(self.client.delete('/api/profiling/slow-requests/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user('guest', password='secret-pass'))
+        self.assertEqual(self.client.get('/api/profiling/slow-requests/').status_code, 403)
+
+    def test_repeated_queries_are_flagged(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in range(4):
+                list(MenuItem.objects.filter(pk=pk))
+            list(MenuItem.objects.filter(pk__in=[1, 2]))
+            list(MenuItem.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(sorted(recorder.duplicates().values()), [2, 4])
+
+
+class StatelessAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('host', password='secret-pass', is_staff=True)
+        cls.table = Table.objects.create(number=1, capacity=4)
+
+    def setUp(self):
+        revocations.clear()
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'username': 'host', 'password': 'secret-pass'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('password', response.data)
+        return response.data
+
+    def test_permission_checks_read_claims_not_the_user_table(self):
+        tokens = self.login()
+        self.assertTrue(AccessToken(tokens['access'])['is_staff'])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/tables/{self.table.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('auth_user', ctx.captured_queries[0]['sql'])
+
+    def test_orders_are_linked_to_the_token_user(self):
+        dish = MenuItem.objects.create(name="Soup", price=Decimal('5.00'))
+        Inventory.objects.create(menu_item=dish, item_name=dish.name, quantity=10)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        response = self.client.post('/api/orders/', {
+            'table': self.table.pk, 'items': [{'menu_item_id': dish.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().placed_by, self.staff)
+
+    def test_refresh_picks_up_role_changes(self):
+        tokens = self.login()
+        User.objects.filter(pk=self.staff.pk).update(is_staff=False)
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+
+    def test_blacklist_checks_are_cached(self):
+        refresh = ClaimsRefreshToken.for_user(self.staff)
+        with self.assertNumQueries(1):
+            refresh.check_blacklist()
+            refresh.check_blacklist()
+
+        refresh.blacklist()
+        with self.assertNumQueries(0):
+            with self.assertRaises(TokenError):
+                refresh.check_blacklist()
+
+
+class DatabaseProfileTests(TransactionTestCase):
+    def test_tuned_profile_pragmas_apply_on_connect(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_concurrent_order_placement_does_not_lock(self):
+        results = benchmarks.write_contention(profiles=['tuned'], threads=4, orders_per_thread=5)
+        self.assertEqual(results['tuned']['failed'], 0)
+        self.assertEqual(Order.objects.count(), 20)
+
+
+@override_settings(DATABASE_REPLICA='default')
+class ReadReplicaRouterTests(SimpleTestCase):
+    def test_reads_use_the_replica_only_inside_replica_reads(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Order))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Order), 'default')
+        self.assertEqual(router.db_for_write(Order), 'default')
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_unconfigured_replica_is_ignored(self):
+        with replica_reads():
+            self.assertIsNone(ReadReplicaRouter().db_for_read(Order))
+
+
+class BranchScopingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('area-manager', password='secret-pass', is_staff=True)
+        cls.ikeja = Branch.objects.create(code='ikeja', name="Ikeja")
+        cls.lekki = Branch.objects.create(code='lekki', name="Lekki")
+        cls.tables = {branch.code: Table.objects.create(branch=branch, number=1, capacity=4) for branch in [cls.ikeja, cls.lekki]}
+        cls.dishes = {}
+        for branch in [cls.ikeja, cls.lekki]:
+            dish = MenuItem.objects.create(branch=branch, name=f"Rice {branch.name}", price=Decimal('5.00'))
+            Inventory.objects.create(branch=branch, menu_item=dish, item_name=dish.name, quantity=10)
+            cls.dishes[branch.code] = dish
+
+    def setUp(self):
+        menu_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_lists_only_show_the_requested_branch(self):
+        response = self.client.get('/api/tables/', HTTP_X_BRANCH='lekki')
+        self.assertEqual([(row['id'], row['branch']) for row in response.data], [(self.tables['lekki'].pk, self.lekki.pk)])
+        self.assertEqual(len(self.client.get('/api/tables/').data), 2)
+
+        menu = self.client.get('/api/menu/', {'branch': 'ikeja'})
+        self.assertEqual([item['name'] for item in menu.data], ["Rice Ikeja"])
+        self.assertEqual(len(self.client.get('/api/menu/').data), 2)
+
+        response = self.client.get(f"/api/tables/{self.tables['ikeja'].pk}/", HTTP_X_BRANCH='lekki')
+        self.assertEqual(response.status_code, 404)
+
+    def test_sales_rollups_are_per_branch(self):
+        clear_price_books()
+        for code, quantity in [('ikeja', 1), ('lekki', 2), ('lekki', 1)]:
+            order = self.client.post('/api/orders/', {
+                'items': [{'menu_item_id': self.dishes[code].pk, 'quantity': quantity}],
+            }, format='json', HTTP_X_BRANCH=code)
+            self.client.post(f"/api/orders/{order.data['id']}/update_status/", {'status': 'closed'}, HTTP_X_BRANCH=code)
+        drain()
+
+        sales = self.client.get('/api/analytics/sales/', HTTP_X_BRANCH='lekki').data
+        self.assertEqual([(row['branch'], row['covers'], row['revenue']) for row in sales], [(self.lekki.pk, 2, '15.00')])
+        items = self.client.get('/api/analytics/items/', HTTP_X_BRANCH='ikeja').data
+        self.assertEqual([(row['menu_item'], row['quantity']) for row in items], [(self.dishes['ikeja'].pk, 1)])
+        self.assertEqual(len(self.client.get('/api/analytics/sales/').data), 2)
+
+        expected = sorted(SalesRollup.objects.values_list('branch', 'period', 'covers', 'revenue'))
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(sorted(SalesRollup.objects.values_list('branch', 'period', 'covers', 'revenue')), expected)
+
+    def test_bulk_status_only_moves_the_branch_orders(self):
+        ikeja, lekki = (Order.objects.create(branch=branch, status='served') for branch in [self.ikeja, self.lekki])
+        response = self.client.post(
+            '/api/orders/bulk-status/', {'ids': [str(ikeja.pk), str(lekki.pk)], 'status': 'closed'},
+            format='json', HTTP_X_BRANCH='lekki',
+        )
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([result['result'] for result in response.data['results']], ['not_found', 'updated'])
+        ikeja.refresh_from_db()
+        self.assertEqual(ikeja.status, 'served')
+
+    def test_menu_responses_vary_on_the_branch_header(self):
+        response = self.client.get('/api/menu/', HTTP_X_BRANCH='ikeja')
+        self.assertIn('X-Branch', response['Vary'])
+
+    def test_unknown_branch_is_not_found(self):
+        Branch.objects.create(code='closed', name="Closed", is_active=False)
+        for code in ['nowhere', 'closed']:
+            self.assertEqual(self.client.get('/api/orders/', HTTP_X_BRANCH=code).status_code, 404)
+
+    def test_orders_are_placed_in_the_branch_from_its_own_menu(self):
+        payload = {'table': self.tables['ikeja'].pk, 'items': [{'menu_item_id': self.dishes['ikeja'].pk, 'quantity': 1}]}
+        response = self.client.post('/api/orders/', payload, format='json', HTTP_X_BRANCH='ikeja')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(pk=response.data['id']).branch, self.ikeja)
+
+        # Another branch's dish or table is rejected
+        foreign_dish = {**payload, 'items': [{'menu_item_id': self.dishes['lekki'].pk, 'quantity': 1}]}
+        self.assertEqual(self.client.post('/api/orders/', foreign_dish, format='json', HTTP_X_BRANCH='ikeja').status_code, 400)
+        foreign_table = {**payload, 'table': self.tables['lekki'].pk}
+        self.assertEqual(self.client.post('/api/orders/', foreign_table, format='json', HTTP_X_BRANCH='ikeja').status_code, 400)
+
+    def test_table_numbers_are_unique_per_branch(self):
+        response = self.client.post('/api/tables/', {'number': 1, 'capacity': 2}, HTTP_X_BRANCH='ikeja')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/tables/', {'number': 2, 'capacity': 2}, HTTP_X_BRANCH='ikeja').status_code, 201)
+        self.assertEqual(self.client.post('/api/tables/', {'number': 1, 'capacity': 2}).status_code, 201)
+        self.assertEqual(Table.objects.filter(branch=self.ikeja).count(), 2)
+
+    def test_branch_queries_use_branch_led_indexes(self):
+        with connection.cursor() as cursor:
+            sql, params = Order.objects.filter(branch=self.ikeja).order_by('-created_at', '-id').query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            self.assertIn('order_branch_created_idx', str(cursor.fetchall()))
+
+
+@override_settings(BRANCH_DATABASES={'east': ['lekki', 'ajah']})
+class BranchRouterTests(SimpleTestCase):
+    def test_branch_data_follows_the_active_branch_database(self):
+        router = BranchRouter()
+        self.assertEqual((branch_alias('lekki'), branch_alias('ikeja')), ('east', 'default'))
+        self.assertIsNone(router.db_for_write(Order))
+        with branch_database('east'):
+            self.assertEqual(router.db_for_read(Order), 'east')
+            self.assertEqual(router.db_for_write(OrderItem), 'east')
+            self.assertIsNone(router.db_for_read(Branch))
+            self.assertIsNone(router.db_for_read(User))
+        with branch_database('default'):
+            self.assertIsNone(router.db_for_read(Order))
+
+    def test_branch_databases_get_only_branch_tables(self):
+        router = BranchRouter()
+        self.assertTrue(router.allow_migrate('east', 'mealtracker', 'order'))
+        self.assertFalse(router.allow_migrate('east', 'mealtracker', 'branch'))
+        self.assertFalse(router.allow_migrate('east', 'auth', 'user'))
+        self.assertIsNone(router.allow_migrate('default', 'mealtracker', 'branch'))
+
+
+class OrderAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root', password='secret-pass')
+        cls.table = Table.objects.create(number=7, capacity=4)
+        cls.dishes = [MenuItem.objects.create(name=f"Dish {i}", price=Decimal('1000.00')) for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def place_orders(self, count):
+        Order.objects.bulk_create([Order(table=self.table) for _ in range(count)])
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.place_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get('/admin/mealtracker/order/').status_code, 200)
+        self.place_orders(40)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get('/admin/mealtracker/order/').status_code, 200)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+    def test_search_matches_ids_and_table_numbers_exactly(self):
+        self.place_orders(1)
+        order = Order.objects.get()
+        for term, found in [(order.pk, 1), (7, 1), (70, 0), ('pasta', 0)]:
+            response = self.client.get('/admin/mealtracker/order/', {'q': term})
+            self.assertEqual(response.context['cl'].result_count, found, term)
+
+    def test_unfiltered_changelist_counts_from_statistics(self):
+        self.place_orders(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        queryset = Order.objects.order_by('-created_at')
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=2):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 3)
+            with CaptureQueriesContext(connection) as queries:
+                EstimatedCountPaginator(queryset, 100).count
+            self.assertNotIn('COUNT(', queries.captured_queries[-1]['sql'])
+            with CaptureQueriesContext(connection) as queries:
+                EstimatedCountPaginator(queryset.filter(status='pending'), 100).count
+            self.assertIn('COUNT(', queries.captured_queries[-1]['sql'])
+
+    def test_changeform_totals_the_order_once(self):
+        order = Order.objects.create(table=self.table)
+        line = OrderItem.objects.create(order=order, menu_item=self.dishes[0], quantity=1, unit_price=Decimal('1000.00'))
+        data = {
+            'table': self.table.pk, 'placed_by': self.admin.pk, 'status': 'pending', 'note': '',
+            'items-TOTAL_FORMS': 3, 'items-INITIAL_FORMS': 1, 'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+            'items-0-id': line.pk, 'items-0-order': order.pk, 'items-0-menu_item': self.dishes[0].pk,
+            'items-0-quantity': 3, 'items-0-unit_price': '1000.00',
+            'items-1-order': order.pk, 'items-1-menu_item': self.dishes[1].pk, 'items-1-quantity': 2, 'items-1-unit_price': '500.00',
+            'items-2-order': order.pk, 'items-2-menu_item': self.dishes[2].pk, 'items-2-quantity': 1, 'items-2-unit_price': '250.00',
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/admin/mealtracker/order/{order.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        order_updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "mealtracker_order"')]
+        self.assertEqual(len(order_updates), 2)  # the form's save and the totals
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal('4250.00'))
+        self.assertEqual(order.total, order.subtotal + order.tax + order.service_charge)
+        self.assertEqual(order.items.get(pk=line.pk).line_total, Decimal('3000.00'))
+
+    def change_status(self, order, status):
+        data = {
+            'table': self.table.pk, 'placed_by': self.admin.pk, 'status': status, 'note': '',
+            'items-TOTAL_FORMS': 0, 'items-INITIAL_FORMS': 0, 'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+        }
+        return self.client.post(f'/admin/mealtracker/order/{order.pk}/change/', data)
+
+    def test_closing_from_the_changeform_goes_through_transitions(self):
+        order = Order.objects.create(table=self.table, placed_by=self.admin)
+        self.assertEqual(self.change_status(order, 'closed').status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'closed')
+        self.assertIsNotNone(order.completed_at)
+        self.assertTrue(OutboxEvent.objects.filter(topic='order.closed', payload={'order': str(order.pk)}).exists())
+
+    def test_changeform_cannot_reopen_a_closed_order(self):
+        order = Order.objects.create(table=self.table, placed_by=self.admin, status='closed')
+        response = self.change_status(order, 'pending')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('status', response.context['adminform'].form.errors)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'closed')
+
+
+class PriceBookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('diner', password='secret-pass')
+        cls.dish = MenuItem.objects.create(name="Moi moi", price=Decimal('5.00'))
+        Inventory.objects.create(menu_item=cls.dish, item_name=cls.dish.name, quantity=100)
+
+    def setUp(self):
+        clear_price_books()
+
+    def place(self, menu_item_id, quantity=1):
+        return place_order(self.user, [{'menu_item_id': menu_item_id, 'quantity': quantity}])
+
+    def test_orders_are_priced_without_reading_the_menu(self):
+        self.place(self.dish.pk)
+        with CaptureQueriesContext(connection) as queries:
+            order = self.place(self.dish.pk, 2)
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "mealtracker_menuitem"' in q['sql']])
+        self.assertEqual(order.items.get().unit_price, Decimal('5.00'))
+        self.assertEqual(order.subtotal, Decimal('10.00'))
+
+    def test_menu_changes_reach_the_book_on_commit(self):
+        self.place(self.dish.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            dish = MenuItem.objects.get(pk=self.dish.pk)
+            dish.price = Decimal('6.00')
+            dish.save()
+        order = self.place(self.dish.pk)
+        self.assertEqual(order.items.get().unit_price, Decimal('6.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dish.available = False
+            dish.save()
+        with self.assertRaises(OrderPlacementError) as raised:
+            self.place(self.dish.pk)
+        self.assertEqual(raised.exception.errors, ["Moi moi is not available"])
+        # Past orders keep the price they were placed at
+        self.assertEqual(order.items.get().unit_price, Decimal('6.00'))
+
+    def test_books_expire_without_a_version_bump(self):
+        self.place(self.dish.pk)
+        # Changed by another process whose cache this one does not share
+        MenuItem.objects.filter(pk=self.dish.pk).update(price=Decimal('7.00'))
+        self.assertEqual(self.place(self.dish.pk).subtotal, Decimal('5.00'))
+        with self.settings(PRICE_BOOK_MAX_AGE=0):
+            self.assertEqual(self.place(self.dish.pk).subtotal, Decimal('7.00'))
+
+    def test_items_missing_from_the_book_are_looked_up_once_more(self):
+        price_book()
+        dish = MenuItem.objects.create(name="Akara", price=Decimal('2.00'))  # not committed, so no version bump
+        Inventory.objects.create(menu_item=dish, item_name=dish.name, quantity=10)
+        self.assertEqual(self.place(dish.pk).total, Order.totals_for(Decimal('2.00'))['total'])
+        with self.assertRaises(OrderPlacementError):
+            self.place(dish.pk + 100)
+
+
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dish = MenuItem.objects.create(name="Ofada", price=Decimal('3.35'))
+        cls.day = timezone.make_aware(datetime(2026, 3, 14, 12))
+        cls.orders = []
+        for quantity in range(1, 8):
+            subtotal = Decimal('3.35') * quantity
+            order = Order.objects.create(status='closed' if quantity % 2 else 'served', **Order.totals_for(subtotal))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=cls.dish, quantity=quantity, unit_price=Decimal('3.35'), line_total=subtotal),
+            ])
+            cls.orders.append(order)
+        Order.objects.update(created_at=cls.day)
+
+    def reconcile(self, **options):
+        return reconcile_orders(self.day - timedelta(hours=12), self.day + timedelta(hours=12), **options)
+
+    def test_matching_orders_reconcile(self):
+        with CaptureQueriesContext(connection) as queries:
+            report = self.reconcile(chunk_size=3)
+        # One query per chunk of three orders, then the empty chunk
+        self.assertEqual(len(queries.captured_queries), 3 + 1)
+        self.assertEqual((report['orders'], report['lines']), (7, 7))
+        self.assertEqual(report['mismatches'], [])
+        self.assertEqual(report['stored'], report['expected'])
+        self.assertEqual(report['stored']['subtotal'], Decimal('93.80'))
+        self.assertEqual(report['by_status']['closed']['orders'], 4)
+        out = StringIO()
+        call_command('reconcile_orders', '--date', '2026-03-14', stdout=out)
+        self.assertIn('All 7 orders reconcile.', out.getvalue())
+
+    def test_cent_rounding_matches_order_totals(self):
+        (tax, tax_base), (service, service_base) = (rate.as_integer_ratio() for rate in Order.rates())
+        for cents in range(0, 20000, 3):
+            totals = Order.totals_for(Decimal(cents).scaleb(-2))
+            self.assertEqual(Decimal(round_half_even(cents * tax, tax_base)).scaleb(-2), totals['tax'])
+            self.assertEqual(Decimal(round_half_even(cents * service, service_base)).scaleb(-2), totals['service_charge'])
+
+    def test_drifted_orders_and_lines_are_reported(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(tax=Decimal('9.99'))
+        OrderItem.objects.filter(order=self.orders[1]).update(line_total=Decimal('1.00'))
+        report = self.reconcile()
+        self.assertCountEqual([m['order'] for m in report['mismatches']], [self.orders[0].pk, self.orders[1].pk])
+        self.assertEqual(len(report['line_mismatches']), 1)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_orders', '--month', '2026-03', stdout=StringIO())
+
+    @override_settings(ORDER_TAX_RATE='0.05')
+    def test_rates_come_from_settings(self):
+        self.assertEqual(len(self.reconcile()['mismatches']), 7)
@@ -8,9 +8,14 @@ from .views import (
     TableViewSet,
     InventoryViewSet,
     OrderViewSet,
+    ArchivedOrderViewSet,
     ReservationViewSet,
+    SalesRollupViewSet,
+    MenuItemSalesRollupViewSet,
     RegisterView,
     LoginView,
+    SlowRequestsView,
+    FloorPlanView,
 )
 
 # ------------------------------------------------------------
@@ -20,8 +25,12 @@ router = DefaultRouter()
 router.register(r'menu', MenuItemViewSet, basename='menu')
 router.register(r'tables', TableViewSet, basename='tables')
 router.register(r'inventory', InventoryViewSet, basename='inventory')
+# Before 'orders' so that 'archive' is not taken for an order id
+router.register(r'orders/archive', ArchivedOrderViewSet, basename='orders-archive')
 router.register(r'orders', OrderViewSet, basename='orders')
 router.register(r'reservations', ReservationViewSet, basename='reservations')
+router.register(r'analytics/sales', SalesRollupViewSet, basename='analytics-sales')
+router.register(r'analytics/items', MenuItemSalesRollupViewSet, basename='analytics-items')
 
 # ------------------------------------------------------------
 # ✅ URL Patterns
@@ -36,4 +45,10 @@ urlpatterns = [
     # JWT Token endpoints (optional but useful for mobile apps / frontend)
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Live table states for floor screens
+    path('floor/', FloorPlanView.as_view(), name='floor'),
+
+    # Request profiling (staff read, admin clear; populated when REQUEST_PROFILING is enabled)
+    path('profiling/slow-requests/', SlowRequestsView.as_view(), name='slow_requests'),
 ]
@@ -1,11 +1,23 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.generics import CreateAPIView
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import CreateAPIView, get_object_or_404
+from rest_framework.views import APIView
+from contextlib import ExitStack
+
 from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import router, transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from .models import MenuItem, Table, Inventory, Order, Reservation
+from .models import (
+    ArchivedOrder, Branch, MenuItem, Table, Inventory, Order, OrderItem, Reservation, SalesRollup, MenuItemSalesRollup,
+)
 from .serializers import (
     RegisterSerializer,
     LoginSerializer,
@@ -13,9 +25,29 @@ from .serializers import (
     TableSerializer,
     InventorySerializer,
     OrderSerializer,
+    OrderCreateSerializer,
+    OrderStatusBatchSerializer,
+    ArchivedOrderSerializer,
     ReservationSerializer,
+    TableAvailabilitySerializer,
+    SalesRollupSerializer,
+    MenuItemSalesRollupSerializer,
 )
 from .permissions import IsStaffOrAdmin, IsAdmin
+from .pagination import OrderCursorPagination, LowStockCursorPagination
+from .filters import OrderFilterBackend, RollupFilterBackend
+from .floor import get_floor_plan
+from .cache import get_menu_payload, get_branch
+from .idempotency import idempotent
+from .middleware import slow_requests
+from .readers import (
+    requested_fields, menu_reader, table_reader, inventory_reader, order_reader, archived_order_reader,
+    attach_order_items,
+)
+from .routers import branch_alias, branch_database, replica_reads
+from .services.orders import transition_orders
+from .services.exports import stream_orders, CONTENT_TYPES
+from .services.reservations import book_table, sync_slots, free_tables, ReservationConflict
 
 User = get_user_model()
 
@@ -40,10 +72,118 @@ class LoginView(TokenObtainPairView):
     permission_classes = [permissions.AllowAny]
 
 
+# ------------------------------------------------------------
+# ✅ BRANCH SCOPING
+# ------------------------------------------------------------
+BRANCH_HEADER = 'X-Branch'
+
+
+def has_branch(model):
+    try:
+        model._meta.get_field('branch')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class BranchScopedMixin:
+    """
+    Scope a viewset to the branch named by the X-Branch header (or ?branch=<code>):
+    querysets are filtered on the leading `branch` column, new rows are created in the
+    branch, related fields only accept the branch's rows and every query goes to the
+    branch's database (see routers.BranchRouter). Without a branch the viewset sees
+    the whole chain in the default database.
+    """
+    branch = None
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.branch_scope:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        code = request.headers.get(BRANCH_HEADER) or request.query_params.get('branch')
+        if code:
+            self.branch = get_branch(code, lambda: Branch.objects.filter(code=code, is_active=True).first())
+            if self.branch is None:
+                raise NotFound(f"Unknown branch '{code}'")
+            self.branch_scope.enter_context(branch_database(branch_alias(code)))
+
+    def scope_to_branch(self, queryset):
+        if self.branch is not None and has_branch(queryset.model):
+            queryset = queryset.filter(branch=self.branch)
+        return queryset
+
+    def get_queryset(self):
+        return self.scope_to_branch(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.branch is not None:
+            for field in getattr(serializer, 'fields', {}).values():
+                if getattr(field, 'queryset', None) is not None:
+                    field.queryset = self.scope_to_branch(field.queryset)
+        return serializer
+
+    def perform_create(self, serializer):
+        serializer.save(branch=self.branch)
+
+
+# ------------------------------------------------------------
+# ✅ LEAN LIST RESPONSES
+# ------------------------------------------------------------
+class ValuesListMixin:
+    """
+    Serve `list` from `.values()` rows through `reader` (see readers.py) instead of
+    serializing model instances; ?fields=a,b limits the response to those fields.
+    """
+    reader = None
+    # Fields outside the reader (e.g. to-many nesting) that `represent` can add
+    extra_fields = []
+
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request, self.reader.field_names + self.extra_fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        lookups, _ = self.reader.compile(fields)
+        ordering = [field.lstrip('-') for field in queryset.query.order_by]
+        rows = queryset.values(*dict.fromkeys([*lookups, *ordering]))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.represent(page, fields))
+        return Response(self.represent(list(rows), fields))
+
+    def represent(self, rows, fields):
+        _, represent = self.reader.compile(fields)
+        return represent(rows)
+
+
 # ------------------------------------------------------------
 # ✅ MENU ITEMS (Public read, Staff/Admin modify)
 # ------------------------------------------------------------
-class MenuItemViewSet(viewsets.ModelViewSet):
+def conditional_response(request, response, etag=None, last_modified=None, private=False):
+    """
+    Attach validators to a response and answer 304 when the client's copy is current.
+    """
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if private:
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    # The branch header picks what is served, so shared caches must key on it
+    patch_vary_headers(response, [BRANCH_HEADER])
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+        response=response,
+    )
+
+
+class MenuItemViewSet(BranchScopedMixin, viewsets.ModelViewSet):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
 
@@ -54,36 +194,126 @@ class MenuItemViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.AllowAny]
         return [perm() for perm in permission_classes]
 
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the menu from cache; ?available=true returns only available items.
+        """
+        available_only = request.query_params.get('available', '').lower() in ['true', '1']
+
+        fields = requested_fields(request, menu_reader.field_names)
+
+        def build():
+            queryset = self.get_queryset().order_by('id')
+            if available_only:
+                queryset = queryset.filter(available=True)
+            lookups, represent = menu_reader.compile()
+            rows = list(queryset.values(*lookups))
+            last_modified = max((row['updated_at'] for row in rows), default=None)
+            return represent(rows), last_modified
+
+        variant = 'available' if available_only else 'all'
+        if self.branch is not None:
+            variant = f'{self.branch.code}:{variant}'
+        payload = get_menu_payload(variant, build)
+        data, etag = payload['data'], payload['etag']
+        if fields:
+            data = [{field: item[field] for field in fields} for item in data]
+            # A sparse list is a different representation from the full one
+            etag = '{}:{}"'.format(etag[:-1], ','.join(fields))
+        return conditional_response(
+            request, Response(data), etag, payload['last_modified'],
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        with replica_reads():
+            instance = self.get_object()
+        etag = f'"{instance.pk}-{instance.updated_at.timestamp()}"'
+        return conditional_response(
+            request, Response(self.get_serializer(instance).data), etag, instance.updated_at,
+        )
+
 
 # ------------------------------------------------------------
 # ✅ TABLES (Staff/Admin only)
 # ------------------------------------------------------------
-class TableViewSet(viewsets.ModelViewSet):
+class TableViewSet(BranchScopedMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Table.objects.all()
     serializer_class = TableSerializer
+    reader = table_reader
     permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
 
 
 # ------------------------------------------------------------
 # ✅ INVENTORY (Staff/Admin only)
 # ------------------------------------------------------------
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(BranchScopedMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
+    reader = inventory_reader
     permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
 
+    def get_queryset(self):
+        if self.action == 'low':
+            return self.scope_to_branch(Inventory.low_stock()).order_by('item_name', 'id')
+        return super().get_queryset()
+
+    @action(detail=False, methods=['get'], pagination_class=LowStockCursorPagination)
+    def low(self, request):
+        """
+        Items at or below their minimum threshold, paged in name order. Accepts ?fields=.
+        """
+        return self.list(request)
+
 
 # ------------------------------------------------------------
 # ✅ ORDERS (Customers create, Staff/Admin manage)
 # ------------------------------------------------------------
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-created_at')
+class OrderViewSet(BranchScopedMixin, ValuesListMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.all().order_by('-created_at', '-id')
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+    filter_backends = [OrderFilterBackend]
+    reader = order_reader
+    extra_fields = ['items']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # Load the table, items and their menu items up front instead of per row
+            queryset = queryset.select_related('table').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return the order, or its archived copy once `archive_orders` has moved it.
+        """
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = get_object_or_404(self.scope_to_branch(ArchivedOrder.objects.all()), pk=kwargs['pk'])
+            return Response(ArchivedOrderSerializer(archived).data)
+
+    def represent(self, rows, fields):
+        orders = super().represent(rows, fields)
+        if fields is None or 'items' in fields:
+            attach_order_items(orders, [row['id'] for row in rows])
+        return orders
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return OrderCreateSerializer
+        return super().get_serializer_class()
 
     def get_permissions(self):
         if self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
-        elif self.action in ['list', 'update', 'partial_update', 'destroy', 'update_status']:
+        elif self.action in ['list', 'update', 'partial_update', 'destroy', 'update_status', 'bulk_status', 'export']:
             permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -100,20 +330,100 @@ class OrderViewSet(viewsets.ModelViewSet):
         if new_status not in dict(Order.STATUS_CHOICES):
             return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
+        [result] = transition_orders([order.pk], new_status)
+        if result['result'] == 'rejected':
+            return Response(
+                {'error': f"Cannot change a {result['previous_status']} order to {new_status}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         return Response({'success': f'Order status updated to {new_status}'})
 
+    @action(detail=False, methods=['post'], url_path='bulk-status',
+            permission_classes=[permissions.IsAuthenticated, IsStaffOrAdmin])
+    def bulk_status(self, request):
+        """
+        Move many orders to one status: {"ids": [...], "status": "served"}.
+        Applied with a single UPDATE; returns a result per order. Orders outside the
+        request's branch are reported as not_found.
+        """
+        serializer = OrderStatusBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        visible = set(self.get_queryset().filter(pk__in=ids).values_list('pk', flat=True))
+        updated = {
+            result['id']: result
+            for result in transition_orders([pk for pk in ids if pk in visible], serializer.validated_data['status'])
+        }
+        results = [updated.get(pk, {'id': pk, 'result': 'not_found', 'previous_status': None}) for pk in ids]
+        return Response({
+            'updated': sum(result['result'] == 'updated' for result in results),
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsStaffOrAdmin])
+    def export(self, request):
+        """
+        Stream orders with their items as ?output=csv (default) or ?output=ndjson.
+        Accepts the same filters as the list, e.g. created_after / created_before.
+        """
+        output_format = request.query_params.get('output', 'csv')
+        if output_format not in CONTENT_TYPES:
+            return Response({'error': 'Invalid output format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Pin the database now: the stream is read after the request's branch scope ends
+        orders = self.filter_queryset(self.get_queryset()).using(router.db_for_read(Order))
+        response = StreamingHttpResponse(stream_orders(orders, output_format), content_type=CONTENT_TYPES[output_format])
+        response['Content-Disposition'] = f'attachment; filename="orders.{output_format}"'
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """
+        Place an order. Send an Idempotency-Key header to make retries safe: a repeat
+        gets the first response back without placing the order again.
+        """
+        return idempotent(request, lambda: super(OrderViewSet, self).create(request, *args, **kwargs))
+
+    def perform_update(self, serializer):
+        """
+        Status changes go through transition_orders, so Order.TRANSITIONS applies, closed
+        and cancelled orders stay final and each close is counted once by the rollups.
+        """
+        new_status = serializer.validated_data.pop('status', None)
+        order = serializer.instance
+        with transaction.atomic(using=router.db_for_write(Order)):
+            if new_status is not None and new_status != order.status:
+                [result] = transition_orders([order.pk], new_status)
+                if result['result'] == 'rejected':
+                    raise ValidationError(
+                        {'status': [f"Cannot change a {result['previous_status']} order to {new_status}"]}
+                    )
+                # Save the other fields over the transitioned row, not the stale status
+                order.refresh_from_db(fields=['status', 'completed_at', 'updated_at'])
+            serializer.save()
+
+
+class ArchivedOrderViewSet(BranchScopedMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Closed and cancelled orders moved out of the live tables by `manage.py archive_orders`.
+    Same filters, paging and ?fields= as the order list; items are included inline.
+    """
+    queryset = ArchivedOrder.objects.all().order_by('-created_at', '-id')
+    serializer_class = ArchivedOrderSerializer
+    pagination_class = OrderCursorPagination
+    filter_backends = [OrderFilterBackend]
+    reader = archived_order_reader
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
+
 
 # ------------------------------------------------------------
 # ✅ RESERVATIONS (Customers book, Staff/Admin manage)
 # ------------------------------------------------------------
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(BranchScopedMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'availability']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
@@ -121,19 +431,103 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         """
-        Create reservation only if table is free
+        Create reservation only if the table is free for the whole booking
         """
-        table_id = request.data.get('table')
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            reservation = book_table(**serializer.validated_data)
+        except ReservationConflict as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        reservation = serializer.instance
+        for field, value in serializer.validated_data.items():
+            setattr(reservation, field, value)
         try:
-            table = Table.objects.get(id=table_id)
-        except Table.DoesNotExist:
-            return Response({'error': 'Table not found'}, status=status.HTTP_404_NOT_FOUND)
+            sync_slots(reservation)
+        except ReservationConflict as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        return Response(self.get_serializer(reservation).data)
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        Tables free for ?party_size=N at ?time=<ISO datetime>
+        """
+        params = TableAvailabilitySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        tables = free_tables(params.validated_data['time'], params.validated_data['party_size'], self.branch)
+        return Response(TableSerializer(tables, many=True).data)
+
+
+# ------------------------------------------------------------
+# ✅ FLOOR PLAN (Staff/Admin)
+# ------------------------------------------------------------
+class FloorPlanView(BranchScopedMixin, APIView):
+    """
+    Every table with its live state (free, seated, reserved or unavailable), the open
+    order seating it and its current or next reservation. Served from cache and
+    rebuilt with one query after changes, so floor screens can poll it every second;
+    send If-None-Match to get 304 while nothing changed.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
+
+    def get(self, request):
+        payload = get_floor_plan(self.branch)
+        data = {'generated_at': payload['generated_at'], 'tables': payload['tables']}
+        return conditional_response(request, Response(data), payload['etag'], private=True)
+
+
+# ------------------------------------------------------------
+# ✅ SALES ANALYTICS (Staff/Admin read-only rollups)
+# ------------------------------------------------------------
+class SalesRollupViewSet(BranchScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Hourly/daily revenue, tax, service charge and covers for closed orders.
+    Reads only the rollup table, so cost does not depend on order history.
+    Rows are per branch; X-Branch returns only that branch's.
+    """
+    queryset = SalesRollup.objects.all()
+    serializer_class = SalesRollupSerializer
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
+    filter_backends = [RollupFilterBackend]
+
 
-        if table.status != 'free':
-            return Response({'error': 'Table not available'}, status=status.HTTP_400_BAD_REQUEST)
+class MenuItemSalesRollupViewSet(BranchScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Hourly/daily quantity and revenue per menu item for closed orders.
+    """
+    queryset = MenuItemSalesRollup.objects.all()
+    serializer_class = MenuItemSalesRollupSerializer
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
+    filter_backends = [RollupFilterBackend]
+
+
+# ------------------------------------------------------------
+# ✅ REQUEST PROFILING (Staff read, Admin clear)
+# ------------------------------------------------------------
+class SlowRequestsView(APIView):
+    """
+    Slowest requests recorded by QueryProfilingMiddleware in this process.
+    DELETE clears the log.
+    """
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            permission_classes = [permissions.IsAuthenticated, IsStaffOrAdmin]
+        else:
+            permission_classes = [permissions.IsAuthenticated, IsAdmin]
+        return [perm() for perm in permission_classes]
 
-        # Mark table as reserved
-        table.status = 'reserved'
-        table.save()
+    def get(self, request):
+        return Response(slow_requests.entries())
 
-        return super().create(request, *args, **kwargs)
+    def delete(self, request):
+        slow_requests.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)